@@ -1,53 +1,70 @@
 from fastapi import APIRouter
-from services.db_service import db_service
-from services.s3_service import s3_service
-from core.config import settings
-import logging
+from fastapi.responses import JSONResponse
+from services.health_service import health_service
 
-logger = logging.getLogger(__name__)
 router = APIRouter()
 
-@router.get("/health")
-async def checkHealth():
-    """
-    Check the health of all service dependencies
-    """
+SERVICE_NAMES = {
+    "database": "Database",
+    "s3": "S3",
+}
+
+
+async def checkReadiness() -> JSONResponse:
+    """Build the dependency health response, with a 503 status if any is unhealthy"""
+    results = await health_service.checkDependencies()
     health_status = {
-        "status": "healthy",
-        "services": {
-            "database": "healthy",
-            "s3": "healthy"
-        }
+        "status": "healthy" if all(results.values()) else "unhealthy",
+        "services": {name: "healthy" if healthy else "unhealthy" for name, healthy in results.items()}
     }
 
-    # Check database health
-    if not db_service.checkHealth():
-        health_status["status"] = "unhealthy"
-        health_status["services"]["database"] = "unhealthy"
-        return {
-            "success": False,
-            "code": 503,
-            "message": "Database service is unhealthy",
-            "data": health_status
-        }
+    unhealthy = [SERVICE_NAMES.get(name, name) for name, healthy in results.items() if not healthy]
+    if unhealthy:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "success": False,
+                "code": 503,
+                "message": "; ".join(f"{name} service is unhealthy" for name in unhealthy),
+                "data": health_status
+            }
+        )
 
-    # Check S3 health
-    try:
-        s3_service.client.head_bucket(Bucket=settings.AWS_S3_EXERCISES_BUCKET)
-    except Exception as e:
-        logger.error(f"S3 health check failed: {str(e)}")
-        health_status["status"] = "unhealthy"
-        health_status["services"]["s3"] = "unhealthy"
-        return {
-            "success": False,
-            "code": 503,
-            "message": "S3 service is unhealthy",
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "code": 200,
+            "message": "All services are healthy",
             "data": health_status
         }
+    )
 
+
+@router.get("/health")
+async def checkHealth():
+    """
+    Check the health of all service dependencies
+    """
+    return await checkReadiness()
+
+
+@router.get("/health/live")
+async def checkLiveness():
+    """
+    Report that the process is up and serving requests, without touching any dependency
+    """
     return {
         "success": True,
         "code": 200,
-        "message": "All services are healthy",
-        "data": health_status
-    }
\ No newline at end of file
+        "message": "Service is alive",
+        "data": {"status": "alive"}
+    }
+
+
+@router.get("/health/ready")
+async def checkReady():
+    """
+    Report whether the service can handle traffic, i.e. its dependencies are healthy
+    """
+    return await checkReadiness()
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from core.metrics import CONTENT_TYPE, registry
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def getMetrics():
+    """
+    Expose stage latencies, in-flight stages, bytes processed, cache lookups,
+    database pool usage and audio jobs in the Prometheus text format
+    """
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
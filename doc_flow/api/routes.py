@@ -1,9 +1,17 @@
-from fastapi import APIRouter, HTTPException, Form
+from fastapi import APIRouter, HTTPException, Form, Header
+from fastapi.responses import JSONResponse, Response
+import asyncio
+import hmac
 import logging
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Optional, Tuple
 import json
+from core.config import settings
+from core.stages import serverTiming
+from core.timestamp_codec import CONTENT_TYPE as TIMESTAMPS_CONTENT_TYPE, encodeTimestamps
 from services.doc_service import doc_service
-from services.elevenlabs_service import elevenlabs_service
+from services.audio_job_service import audio_job_service
+from services.elevenlabs_service import timestampsKey
 from services.db_service import db_service
 from services.s3_service import s3_service
 
@@ -14,8 +22,10 @@ router = APIRouter()
 
 @router.post("/get-exercise-topics", response_model=dict)
 async def getExerciseTopics(
+    response: Response,
     file_id: str = Form(...),
-    file_type: str = Form(...)
+    file_type: str = Form(...),
+    previous_file_id: Optional[str] = Form(None)
 ) -> dict:
     """
     Extract topics from a document file.
@@ -28,16 +38,24 @@ async def getExerciseTopics(
         request: JSON request body
         file_id: File ID from form data
         file_type: File type from form data
+        previous_file_id: Optional file ID of the previous version of the
+            document; only the pages that changed since are reprocessed
 
     Returns:
-        List of extracted topics or error response
+        List of extracted topics or error response; the duration of each
+        processing stage is reported in the Server-Timing header
     """
+    file_content = None
+    timings: Dict[str, float] = {}
     try:
-        # Get file content
-        file_content = await s3_service.getFile(key=file_id)
+        # Stream the file from S3 into a spooled temp file
+        started = time.perf_counter()
+        file_content = await s3_service.spoolFile(key=file_id)
+        timings["fetch"] = time.perf_counter() - started
 
         # Process file
-        topics = await doc_service.processFile(file_id, file_content)
+        topics = await doc_service.processFile(file_id, file_content, file_type, timings=timings,
+                                               previous_file_id=previous_file_id)
 
         return {
             "success": True,
@@ -51,6 +69,11 @@ async def getExerciseTopics(
             "code": e.status_code,
             "message": e.detail,
         }
+    finally:
+        if timings:
+            response.headers["Server-Timing"] = serverTiming(timings)
+        if file_content is not None:
+            file_content.close()
 
 
 @router.post("/generate-audio", response_model=dict)
@@ -59,30 +82,150 @@ async def generateAudio(
     generate_text: str = Form(...)
 ) -> dict:
     """
-    Generate audio from text for an exercise.
+    Queue audio generation from text for an exercise.
+
+    The audio is generated in the background; poll /audio-jobs/{job_id}
+    for the result.
 
     Args:
         exercise_id: Exercise ID
         generate_text: Text to generate audio from
 
     Returns:
-        Audio generation response with URL to the generated audio file
+        The queued job, including its job_id
     """
     try:
         # Validate exercise ID
-        if not db_service.exercise_exists(exercise_id):
+        if not await db_service.exerciseExistsAsync(exercise_id):
             raise HTTPException(
                 status_code=404,
                 detail=f"Exercise with ID {exercise_id} not found"
             )
 
-        # Generate audio
-        await elevenlabs_service.generateAudio(exercise_id, generate_text)
+        # Queue audio generation
+        job = await audio_job_service.submit(exercise_id, generate_text)
+
+        return {
+            "success": True,
+            "code": 202,
+            "message": "Audio generation queued",
+            "data": job
+        }
+    except HTTPException as e:
+        return {
+            "success": False,
+            "code": e.status_code,
+            "message": e.detail,
+        }
+
+
+@router.post("/exercises/exists", response_model=dict)
+async def exercisesExist(exercise_ids: List[str] = Form(...)) -> dict:
+    """
+    Check which of several exercises exist, in one database round-trip.
+
+    Args:
+        exercise_ids: Exercise IDs to check
+
+    Returns:
+        A mapping of each exercise ID to whether it exists
+    """
+    try:
+        existing = await db_service.existingExercisesAsync(exercise_ids)
+        return {
+            "success": True,
+            "code": 200,
+            "message": "Exercises checked",
+            "data": {exercise_id: exercise_id in existing for exercise_id in exercise_ids}
+        }
+    except HTTPException as e:
+        return {
+            "success": False,
+            "code": e.status_code,
+            "message": e.detail,
+        }
+
+
+def _checkServiceSecret(authorization: Optional[str]) -> None:
+    """
+    Check that a presign request comes from the Wasp server.
+
+    Raises:
+        HTTPException: 503 if PRESIGN_API_SECRET isn't set, 401 if the
+        Authorization header doesn't carry it
+    """
+    if not settings.PRESIGN_API_SECRET:
+        raise HTTPException(status_code=503, detail="Presigned URLs are disabled: PRESIGN_API_SECRET is not set")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.PRESIGN_API_SECRET.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing API secret")
+
+
+@router.post("/uploads/presign", response_model=dict)
+async def presignUpload(
+    user_id: str = Form(...),
+    filename: Optional[str] = Form(None),
+    content_type: Optional[str] = Form(None),
+    authorization: Optional[str] = Header(None)
+) -> dict:
+    """
+    Mint a presigned POST to upload a file directly to S3, under a new key
+    in the user's upload prefix. Only the Wasp server may call it.
+
+    Args:
+        user_id: User the upload is for, authenticated by the Wasp server
+        filename: Name of the file, whose extension the key keeps
+        content_type: Content type the upload will be sent with
+
+    Returns:
+        The key to later pass as file_id to /get-exercise-topics, the URL and
+        form fields to upload with, the size limit and the expiry in seconds
+    """
+    try:
+        _checkServiceSecret(authorization)
+        return {
+            "success": True,
+            "code": 200,
+            "message": "Upload URL created",
+            "data": s3_service.getUploadUrl(user_id, filename, content_type)
+        }
+    except HTTPException as e:
+        return {
+            "success": False,
+            "code": e.status_code,
+            "message": e.detail,
+        }
+
+
+@router.post("/uploads/multipart", response_model=dict)
+async def createMultipartUpload(
+    user_id: str = Form(...),
+    part_count: int = Form(...),
+    filename: Optional[str] = Form(None),
+    content_type: Optional[str] = Form(None),
+    authorization: Optional[str] = Header(None)
+) -> dict:
+    """
+    Start a multipart upload to S3 with a presigned URL per part, under a
+    new key in the user's upload prefix. Only the Wasp server may call it.
 
+    Args:
+        user_id: User the upload is for, authenticated by the Wasp server
+        part_count: Number of parts; all but the last must be at least 5 MiB
+        filename: Name of the file, whose extension the key keeps
+        content_type: Content type of the assembled file
+
+    Returns:
+        The key, the upload_id and the URL of each part number
+    """
+    try:
+        _checkServiceSecret(authorization)
+        upload = await s3_service.createPresignedMultipartUpload(user_id, part_count, filename, content_type)
         return {
             "success": True,
             "code": 200,
-            "message": "Audio generated successfully",
+            "message": "Multipart upload created",
+            "data": upload
         }
     except HTTPException as e:
         return {
@@ -92,6 +235,248 @@ async def generateAudio(
         }
 
 
+@router.post("/uploads/multipart/complete", response_model=dict)
+async def completeMultipartUpload(
+    user_id: str = Form(...),
+    key: str = Form(...),
+    upload_id: str = Form(...),
+    parts: str = Form(...),
+    authorization: Optional[str] = Header(None)
+) -> dict:
+    """
+    Complete a multipart upload of the user's once all its parts are uploaded.
+
+    Args:
+        user_id: User the upload was created for
+        key: S3 key returned by /uploads/multipart
+        upload_id: Upload ID returned by /uploads/multipart
+        parts: JSON list of {"part_number", "etag"}, with the ETag header of each part upload
+
+    Returns:
+        Success or error response
+    """
+    try:
+        _checkServiceSecret(authorization)
+        try:
+            uploaded_parts = json.loads(parts)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="parts must be a JSON list")
+        if not isinstance(uploaded_parts, list):
+            raise HTTPException(status_code=400, detail="parts must be a JSON list")
+
+        await s3_service.completePresignedMultipartUpload(user_id, key, upload_id, uploaded_parts)
+        return {
+            "success": True,
+            "code": 200,
+            "message": "Multipart upload completed",
+            "data": {"key": key}
+        }
+    except HTTPException as e:
+        return {
+            "success": False,
+            "code": e.status_code,
+            "message": e.detail,
+        }
+
+
+@router.post("/uploads/multipart/abort", response_model=dict)
+async def abortMultipartUpload(
+    user_id: str = Form(...),
+    key: str = Form(...),
+    upload_id: str = Form(...),
+    authorization: Optional[str] = Header(None)
+) -> dict:
+    """
+    Abort a multipart upload of the user's and discard its parts.
+
+    Args:
+        user_id: User the upload was created for
+        key: S3 key returned by /uploads/multipart
+        upload_id: Upload ID returned by /uploads/multipart
+
+    Returns:
+        Success or error response
+    """
+    try:
+        _checkServiceSecret(authorization)
+        if not await s3_service.abortPresignedMultipartUpload(user_id, key, upload_id):
+            raise HTTPException(status_code=500, detail="Failed to abort multipart upload")
+        return {
+            "success": True,
+            "code": 200,
+            "message": "Multipart upload aborted",
+        }
+    except HTTPException as e:
+        return {
+            "success": False,
+            "code": e.status_code,
+            "message": e.detail,
+        }
+
+
+@router.post("/downloads/presign", response_model=dict)
+async def presignDownload(
+    user_id: str = Form(...),
+    key: Optional[str] = Form(None),
+    exercise_id: Optional[str] = Form(None),
+    filename: Optional[str] = Form(None),
+    authorization: Optional[str] = Header(None)
+) -> dict:
+    """
+    Mint a presigned URL to download a file directly from S3: one of the
+    user's uploads, or the generated audio of one of the user's exercises.
+    Only the Wasp server may call it.
+
+    Args:
+        user_id: User the download is for, authenticated by the Wasp server
+        key: S3 key of one of the user's uploads
+        exercise_id: Exercise whose audio to download, instead of key
+        filename: Optional name to save the file as
+
+    Returns:
+        The URL and method to download with, and the expiry in seconds
+    """
+    try:
+        _checkServiceSecret(authorization)
+        if (key is None) == (exercise_id is None):
+            raise HTTPException(status_code=400, detail="Pass either key or exercise_id")
+        if exercise_id is not None:
+            if await db_service.exerciseOwnerAsync(exercise_id) != user_id:
+                raise HTTPException(status_code=404, detail=f"Exercise {exercise_id} not found")
+            key = f"{exercise_id}.mp3"
+        else:
+            s3_service.checkOwnedKey(user_id, key)
+        return {
+            "success": True,
+            "code": 200,
+            "message": "Download URL created",
+            "data": s3_service.getDownloadUrl(key, filename)
+        }
+    except HTTPException as e:
+        return {
+            "success": False,
+            "code": e.status_code,
+            "message": e.detail,
+        }
+
+
+@router.get("/audio-jobs/{job_id}", response_model=dict)
+async def getAudioJob(job_id: str) -> dict:
+    """
+    Report the status of an audio generation job.
+
+    Args:
+        job_id: Job ID returned by /generate-audio
+
+    Returns:
+        The job, with status "queued", "running", "completed" or "failed"
+    """
+    job = audio_job_service.getJob(job_id)
+    if job is None:
+        return {
+            "success": False,
+            "code": 404,
+            "message": f"Audio job {job_id} not found",
+        }
+
+    return {
+        "success": True,
+        "code": 200,
+        "message": f"Audio job is {job['status']}",
+        "data": job
+    }
+
+
+def _parseByteRange(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=" range into inclusive (start, end) offsets.
+
+    Returns None for malformed and multi-range headers, which are answered
+    with the whole content.
+
+    Raises:
+        HTTPException: 416 if the range cannot be satisfied
+    """
+    unit, _, spec = range_header.partition("=")
+    first, _, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else None
+    except ValueError:
+        return None
+
+    if start is None and end is None:
+        return None
+    if start is None:
+        # Suffix range: the last N bytes
+        if end <= 0 or size == 0:
+            raise HTTPException(status_code=416, detail="Requested range not satisfiable")
+        return max(size - end, 0), size - 1
+    if end is not None and end < start:
+        return None
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable")
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+@router.get("/audio-timestamps/{exercise_id}")
+async def getAudioTimestamps(
+    exercise_id: str,
+    range_header: Optional[str] = Header(None, alias="Range")
+) -> Response:
+    """
+    Serve the word timestamps of an exercise in the compact binary format.
+
+    The blob stored next to the MP3 is served when there is one; otherwise
+    the timestamps stored in the database are encoded on the fly. Single byte
+    ranges are supported with 206 Partial Content responses; the header and
+    block index at the start of the blob tell a client which range holds the
+    words around a playback position (see timestamp_codec.readBlockIndex).
+
+    Args:
+        exercise_id: Exercise ID
+        range_header: Optional HTTP Range header
+
+    Returns:
+        The encoded timestamps (see core.timestamp_codec)
+    """
+    blob = await s3_service.getFile(timestampsKey(exercise_id))
+    if blob is None:
+        try:
+            timestamps = await db_service.getExerciseAudioTimestampsAsync(exercise_id)
+        except HTTPException as e:
+            return JSONResponse(
+                status_code=e.status_code,
+                content={"success": False, "code": e.status_code, "message": e.detail}
+            )
+        if timestamps is None:
+            return JSONResponse(
+                status_code=404,
+                content={
+                    "success": False,
+                    "code": 404,
+                    "message": f"Audio timestamps for exercise {exercise_id} not found"
+                }
+            )
+        blob = await asyncio.to_thread(encodeTimestamps, timestamps)
+
+    headers = {"Accept-Ranges": "bytes"}
+    if range_header:
+        try:
+            byte_range = _parseByteRange(range_header, len(blob))
+        except HTTPException:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{len(blob)}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(blob)}"
+            return Response(blob[start:end + 1], status_code=206,
+                            media_type=TIMESTAMPS_CONTENT_TYPE, headers=headers)
+
+    return Response(blob, media_type=TIMESTAMPS_CONTENT_TYPE, headers=headers)
+
+
 @router.get("/")
 def getRoot() -> Dict[str, Any]:
     """Root endpoint"""
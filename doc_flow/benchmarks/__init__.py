@@ -0,0 +1,13 @@
+"""
+Load and micro benchmarks for the doc_flow API.
+
+Run from the doc_flow directory:
+
+    python -m benchmarks micro
+    python -m benchmarks load --concurrency 16 --requests 200
+
+The load benchmark runs the API in a subprocess against local stand-ins for
+S3, Tika, OpenAI, ElevenLabs and the database (see stubs.py and serve.py),
+so it needs no credentials or network access. Results are saved as JSON
+under benchmarks/results/ and can be compared with --compare.
+"""
@@ -0,0 +1,66 @@
+import argparse
+import sys
+from benchmarks.results import compareResults, loadResults, printResults, saveResults
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="doc_flow benchmarks")
+    parser.add_argument("--out", help="Where to save the results (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    suites = parser.add_subparsers(dest="suite", required=True)
+
+    micro = suites.add_parser("micro", help="Microbenchmarks of the CPU-bound hot paths")
+    micro.add_argument("--repeat", type=int, default=20)
+    micro.add_argument("--corpus-words", type=int, default=200_000)
+    micro.add_argument("--lesson-words", type=int, default=9000)
+    micro.add_argument("--document-size", type=int, default=20)
+    micro.add_argument("--corpus-mb", type=float, help="Size of the URL filter corpus, e.g. 50 (overrides --corpus-words)")
+    micro.add_argument("--legacy", action="store_true",
+                       help="Time the original URL filter and timestamp grouping, as a baseline for --compare")
+
+    load = suites.add_parser("load", help="Concurrent load against the API with local stand-ins")
+    load.add_argument("--scenario", action="append", choices=["get_exercise_topics", "generate_audio"],
+                      help="Scenario to run, may be repeated (default: all)")
+    load.add_argument("--concurrency", type=int, default=8)
+    load.add_argument("--requests", type=int, default=100)
+    load.add_argument("--documents", type=int, default=8)
+    load.add_argument("--file-type", default="pdf", choices=["pdf", "pptx", "xlsx", "docx"],
+                      help="docx and other types go through the Tika stand-in")
+    load.add_argument("--document-size", type=int, default=20)
+    load.add_argument("--lesson-words", type=int, default=600)
+    load.add_argument("--s3-latency", type=float, default=0.01)
+    load.add_argument("--tika-latency", type=float, default=0.2)
+    load.add_argument("--openai-latency", type=float, default=0.5)
+    load.add_argument("--elevenlabs-latency", type=float, default=0.5)
+    load.add_argument("--db-latency", type=float, default=0.005)
+    load.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                      help="Extra setting for the API process, may be repeated")
+
+    args = parser.parse_args()
+    params = {name: value for name, value in vars(args).items() if name not in ("out", "compare", "suite")}
+
+    if args.suite == "micro":
+        from benchmarks.micro import runMicro
+        results = runMicro(args.repeat, args.corpus_words, args.lesson_words, args.document_size,
+                           args.corpus_mb, args.legacy)
+    else:
+        from benchmarks.load import runLoad
+        results = runLoad(
+            scenarios=args.scenario or ("get_exercise_topics", "generate_audio"),
+            concurrency=args.concurrency, requests=args.requests, documents=args.documents,
+            file_type=args.file_type, document_size=args.document_size, lesson_words=args.lesson_words,
+            s3_latency=args.s3_latency, tika_latency=args.tika_latency, openai_latency=args.openai_latency,
+            elevenlabs_latency=args.elevenlabs_latency, db_latency=args.db_latency,
+            extra_env=dict(setting.split("=", 1) for setting in args.env))
+
+    printResults(results)
+    path = saveResults(args.suite, params, results, args.out)
+    print(f"Results saved to {path}")
+    if args.compare:
+        for line in compareResults(loadResults(args.compare), loadResults(path)):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
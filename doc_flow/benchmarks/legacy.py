@@ -0,0 +1,40 @@
+import re
+from typing import Dict, List, Sequence
+
+# The implementations the optimized hot paths replaced, kept as the baseline
+# of the micro benchmarks (--legacy) and as reference output for the tests.
+
+
+def legacyFilterUrls(text: str) -> str:
+    """The original _filter_urls: six sequential re.sub passes"""
+    text = re.sub(
+        r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
+    text = re.sub(
+        r'(?:www\.)?[a-zA-Z0-9-]+\.[a-zA-Z]{2,}(?:\.[a-zA-Z]{2,})?(?:/\S*)?', '', text)
+    text = re.sub(
+        r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=[\w-]+', '', text)
+    text = re.sub(r'arxiv:\d{4}\.\d{4,5}', '', text)
+    text = re.sub(r'source:\s*[^\n]+', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def legacyExtractTimestamps(chars: Sequence[str], starts: Sequence[float],
+                            ends: Sequence[float]) -> List[Dict]:
+    """The original extractTimestamps: a Python loop over the characters"""
+    timestamps = []
+    current_word = ""
+    word_start = 0
+    for i in range(len(chars)):
+        char = chars[i]
+        if char.isspace():
+            if current_word:
+                timestamps.append({"word": current_word, "start": word_start, "end": ends[i - 1]})
+                current_word = ""
+        else:
+            if not current_word:
+                word_start = starts[i]
+            current_word += char
+    if current_word:
+        timestamps.append({"word": current_word, "start": word_start, "end": ends[-1]})
+    return timestamps
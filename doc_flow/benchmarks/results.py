@@ -0,0 +1,100 @@
+import json
+import math
+import platform
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Metrics where a larger value is an improvement; for the rest smaller is better
+_HIGHER_IS_BETTER = ("rps", "_per_second")
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """The q-th percentile (0-100) of values, by the nearest-rank method"""
+    if not values:
+        return math.nan
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarizeLatencies(latencies: Sequence[float]) -> Dict[str, float]:
+    """p50, p99, mean and max of latencies in seconds, reported in milliseconds"""
+    if not latencies:
+        return {"p50_ms": math.nan, "p99_ms": math.nan, "mean_ms": math.nan, "max_ms": math.nan}
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+
+
+def _gitRevision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=RESULTS_DIR.parent).stdout.strip()
+    except Exception:
+        return None
+
+
+def saveResults(suite: str, params: Dict, benchmarks: Dict[str, Dict], path: Optional[str] = None) -> Path:
+    """
+    Save benchmark results as JSON.
+
+    Returns:
+        The path written, by default benchmarks/results/{suite}-{timestamp}.json
+    """
+    document = {
+        "suite": suite,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": _gitRevision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "benchmarks": benchmarks,
+    }
+    if path is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{suite}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    else:
+        output = Path(path)
+    output.write_text(json.dumps(document, indent=2, sort_keys=True))
+    return output
+
+
+def loadResults(path: str) -> Dict:
+    return json.loads(Path(path).read_text())
+
+
+def compareResults(baseline: Dict, current: Dict) -> List[str]:
+    """
+    Describe the change of every numeric metric present in both results.
+
+    Returns:
+        One line per metric, marking regressions of more than 5%
+    """
+    lines = []
+    for name, metrics in current["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            continue
+        for metric, value in metrics.items():
+            before = previous.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(before, (int, float)) or not before:
+                continue
+            change = (value - before) / before * 100
+            worse = -change if metric.endswith(_HIGHER_IS_BETTER) else change
+            marker = "  REGRESSION" if worse > 5 else ""
+            lines.append(f"{name}.{metric}: {before:.3f} -> {value:.3f} ({change:+.1f}%){marker}")
+    return lines
+
+
+def printResults(benchmarks: Dict[str, Dict]) -> None:
+    for name, metrics in benchmarks.items():
+        formatted = ", ".join(f"{metric}={value:.3f}" if isinstance(value, float) else f"{metric}={value}"
+                              for metric, value in metrics.items())
+        print(f"{name}: {formatted}")
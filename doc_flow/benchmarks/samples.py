@@ -0,0 +1,91 @@
+import io
+import random
+from types import SimpleNamespace
+from typing import List
+
+_WORDS = ("the gradient descent algorithm converges when the learning rate is small enough "
+          "see figure three and equation four in section two for the main result").split()
+_URLS = ["https://example.com/a?b=c", "www.stanford.edu", "arxiv:2101.12345",
+         "\nsource: Stanford CS231n slides\n", "youtube.com/watch?v=dQw4w9WgXcQ"]
+
+
+def buildText(words: int, seed: int = 1, url_rate: float = 0.01) -> str:
+    """Lecture-like prose with a sprinkling of URLs and source attributions"""
+    rng = random.Random(seed)
+    parts = [rng.choice(_URLS) if rng.random() < url_rate else rng.choice(_WORDS) for _ in range(words)]
+    sentences = [" ".join(parts[i:i + 15]) + "." for i in range(0, len(parts), 15)]
+    return " ".join(sentences)
+
+
+def buildCorpus(megabytes: float, seed: int = 1) -> str:
+    """At least megabytes MB of buildText prose, made by repeating a 100k word sample"""
+    sample = buildText(100_000, seed)
+    return " ".join([sample] * -(-int(megabytes * 1e6) // (len(sample) + 1)))
+
+
+def buildPdf(pages: int, words_per_page: int = 400) -> bytes:
+    import fitz
+
+    document = fitz.open()
+    for page_number in range(pages):
+        page = document.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), buildText(words_per_page, seed=page_number), fontsize=9)
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+def buildPptx(slides: int, words_per_slide: int = 80) -> bytes:
+    from pptx import Presentation
+
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for slide_number in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {slide_number + 1}"
+        slide.placeholders[1].text = buildText(words_per_slide, seed=slide_number)
+    output = io.BytesIO()
+    presentation.save(output)
+    return output.getvalue()
+
+
+def buildXlsx(rows: int, columns: int = 8) -> bytes:
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    rng = random.Random(1)
+    for row in range(rows):
+        sheet.append([rng.choice(_WORDS) if column % 2 else rng.random() for column in range(columns)])
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def buildDocument(file_type: str, size: int) -> bytes:
+    """A document of the given type; size is pages, slides or rows"""
+    if file_type == "pdf":
+        return buildPdf(size)
+    if file_type == "pptx":
+        return buildPptx(size)
+    if file_type == "xlsx":
+        return buildXlsx(size * 50)
+    # Anything else is sent to Tika, whose stand-in ignores the content
+    return b"PK\x03\x04" + buildText(size * 400).encode("utf-8")
+
+
+def buildListenText(words: int) -> str:
+    """Exercise text with the narrated part in <listen> tags"""
+    return f"<h1>Lesson</h1><listen>{buildText(words, url_rate=0)}</listen>"
+
+
+def buildTtsResponse(words: int) -> SimpleNamespace:
+    """An object shaped like an ElevenLabs response with a character alignment for words words"""
+    text = buildText(words, url_rate=0)
+    starts: List[float] = [index * 0.06 for index in range(len(text))]
+    alignment = SimpleNamespace(
+        characters=list(text),
+        character_start_times_seconds=starts,
+        character_end_times_seconds=[start + 0.06 for start in starts],
+    )
+    return SimpleNamespace(normalized_alignment=alignment, alignment=alignment)
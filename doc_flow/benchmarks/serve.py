@@ -0,0 +1,58 @@
+"""
+Entry point the load benchmark runs the API with, in its own process.
+
+External services are reached through the URLs in the environment (see
+load.py); the database, which has no local stand-in server, is replaced by
+an in-memory one with BENCH_DB_LATENCY seconds of latency per call.
+"""
+import argparse
+import asyncio
+import os
+from typing import Dict, List, Optional, Union
+
+
+def installDatabaseStandIn(latency: float) -> None:
+    from core.timestamps import WordTimestamps
+    from services.db_service import db_service
+
+    audio_timestamps: Dict[str, Union[List[Dict], WordTimestamps]] = {}
+
+    async def exerciseExistsAsync(exercise_id: str) -> bool:
+        await asyncio.sleep(latency)
+        return True
+
+    async def updateExerciseAudioTimestampsAsync(exercise_id: str,
+                                                 timestamps: Union[List[Dict], WordTimestamps]) -> None:
+        await asyncio.sleep(latency)
+        audio_timestamps[exercise_id] = timestamps
+
+    async def getExerciseAudioTimestampsAsync(exercise_id: str) -> Optional[List[Dict]]:
+        await asyncio.sleep(latency)
+        timestamps = audio_timestamps.get(exercise_id)
+        if isinstance(timestamps, WordTimestamps):
+            return timestamps.toDicts()
+        return timestamps
+
+    async def checkHealthAsync() -> bool:
+        return True
+
+    db_service.exerciseExistsAsync = exerciseExistsAsync
+    db_service.updateExerciseAudioTimestampsAsync = updateExerciseAudioTimestampsAsync
+    db_service.getExerciseAudioTimestampsAsync = getExerciseAudioTimestampsAsync
+    db_service.checkHealthAsync = checkHealthAsync
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    installDatabaseStandIn(float(os.environ.get("BENCH_DB_LATENCY", "0")))
+    from main import app
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+Reply = Tuple[int, Dict[str, str], bytes]
+
+# A silent MPEG-1 Layer III frame at 64 kbps / 44.1 kHz, the format the
+# service requests (mp3_44100_64): 208 bytes lasting 1152 / 44100 seconds
+_MP3_FRAME = b"\xff\xfb\x50\x00" + bytes(204)
+_MP3_FRAME_SECONDS = 1152 / 44100
+# Speaking rate of the synthesized "speech"
+_SECONDS_PER_CHARACTER = 0.06
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stub: "StubServer" = None
+
+    def _readBody(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                chunk = self.rfile.read(size)
+                self.rfile.readline()
+                if size == 0:
+                    return b"".join(chunks)
+                chunks.append(chunk)
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _dispatch(self) -> None:
+        body = self._readBody()
+        if self.stub.latency:
+            time.sleep(self.stub.latency)
+        status, headers, payload = self.stub.handle(self.command, self.path, self.headers, body)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = _dispatch
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class StubServer:
+    """
+    A local HTTP stand-in for an external service, served from a background
+    thread. Every request is answered after latency seconds, simulating the
+    round-trip to the real service.
+
+    Use as a context manager, or call start and stop.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        handler = type(f"{type(self).__name__}Handler", (_Handler,), {"stub": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def handle(self, method: str, path: str, headers, body: bytes) -> Reply:
+        raise NotImplementedError
+
+
+def _jsonReply(payload, status: int = 200) -> Reply:
+    return status, {"Content-Type": "application/json"}, json.dumps(payload).encode("utf-8")
+
+
+def _xmlReply(xml: str, status: int = 200) -> Reply:
+    return status, {"Content-Type": "application/xml"}, f'<?xml version="1.0" encoding="UTF-8"?>{xml}'.encode("utf-8")
+
+
+def _etag(content: bytes) -> str:
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+class FakeS3(StubServer):
+    """
+    In-memory S3 stand-in for the operations S3Service uses: get, put,
+    copy, delete and head_bucket, and multipart uploads. Path-style
+    addressing only; requests are not authenticated.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self._uploads: Dict[str, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, bucket: str, key: str, content: bytes) -> None:
+        """Seed an object directly, without a request"""
+        with self._lock:
+            self.objects[(bucket, key)] = content
+
+    def handle(self, method: str, path: str, headers, body: bytes) -> Reply:
+        url = urlsplit(path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+        if not key:
+            # head_bucket (and anything else at bucket level)
+            return 200, {}, b""
+
+        if method == "POST" and "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            with self._lock:
+                self._uploads[upload_id] = {}
+            return _xmlReply(f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                             f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+        if "uploadId" in query:
+            return self._handleUpload(method, bucket, key, query, body)
+
+        if method == "PUT":
+            copy_source = headers.get("x-amz-copy-source")
+            if copy_source:
+                source_bucket, _, source_key = unquote(copy_source).lstrip("/").partition("/")
+                with self._lock:
+                    content = self.objects.get((source_bucket, source_key))
+                    if content is None:
+                        return self._noSuchKey(method, source_key)
+                    self.objects[(bucket, key)] = content
+                return _xmlReply(f"<CopyObjectResult><LastModified>2025-01-01T00:00:00.000Z</LastModified>"
+                                 f"<ETag>{_etag(content)}</ETag></CopyObjectResult>")
+            self.put(bucket, key, body)
+            return 200, {"ETag": _etag(body)}, b""
+
+        if method in ("GET", "HEAD"):
+            with self._lock:
+                content = self.objects.get((bucket, key))
+            if content is None:
+                return self._noSuchKey(method, key)
+            return 200, {"Content-Type": "application/octet-stream", "ETag": _etag(content)}, content
+
+        if method == "DELETE":
+            with self._lock:
+                self.objects.pop((bucket, key), None)
+            return 204, {}, b""
+        return _xmlReply("<Error><Code>NotImplemented</Code></Error>", 501)
+
+    def _handleUpload(self, method: str, bucket: str, key: str, query: Dict[str, List[str]], body: bytes) -> Reply:
+        upload_id = query["uploadId"][0]
+        with self._lock:
+            parts = self._uploads.get(upload_id)
+            if parts is None:
+                return _xmlReply("<Error><Code>NoSuchUpload</Code></Error>", 404)
+            if method == "PUT":
+                parts[int(query["partNumber"][0])] = body
+                return 200, {"ETag": _etag(body)}, b""
+            if method == "GET":
+                listed = "".join(f"<Part><PartNumber>{number}</PartNumber><ETag>{_etag(content)}</ETag>"
+                                 f"<Size>{len(content)}</Size></Part>" for number, content in sorted(parts.items()))
+                return _xmlReply(f"<ListPartsResult><Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                                 f"<UploadId>{upload_id}</UploadId><IsTruncated>false</IsTruncated>"
+                                 f"{listed}</ListPartsResult>")
+            del self._uploads[upload_id]
+            if method == "DELETE":
+                return 204, {}, b""
+            content = b"".join(parts[number] for number in sorted(parts))
+            self.objects[(bucket, key)] = content
+        return _xmlReply(f"<CompleteMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{key}</Key>"
+                         f"<ETag>{_etag(content)}</ETag></CompleteMultipartUploadResult>")
+
+    @staticmethod
+    def _noSuchKey(method: str, key: str) -> Reply:
+        if method == "HEAD":
+            return 404, {}, b""
+        return _xmlReply(f"<Error><Code>NoSuchKey</Code><Key>{key}</Key>"
+                         f"<Message>The specified key does not exist.</Message></Error>", 404)
+
+
+class TikaStub(StubServer):
+    """Tika server stand-in answering /rmeta/text with a fixed text"""
+
+    def __init__(self, text: str, latency: float = 0.0):
+        super().__init__(latency)
+        self.text = text
+
+    def handle(self, method: str, path: str, headers, body: bytes) -> Reply:
+        return _jsonReply([{"Content-Type": "application/octet-stream", "X-TIKA:content": self.text}])
+
+
+class OpenAIStub(StubServer):
+    """OpenAI stand-in answering chat completions with a fixed list of topics"""
+
+    def __init__(self, topics: Optional[List[str]] = None, latency: float = 0.0):
+        super().__init__(latency)
+        self.topics = topics or ["Gradient descent", "Learning rate schedules", "Convergence"]
+
+    def handle(self, method: str, path: str, headers, body: bytes) -> Reply:
+        return _jsonReply({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": ", ".join(self.topics)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": 16,
+                      "total_tokens": len(body) // 4 + 16},
+        })
+
+
+def synthesize(text: str) -> Tuple[bytes, Dict]:
+    """Silent MP3 audio for text with a matching character alignment"""
+    starts = [index * _SECONDS_PER_CHARACTER for index in range(len(text))]
+    alignment = {
+        "characters": list(text),
+        "character_start_times_seconds": starts,
+        "character_end_times_seconds": [start + _SECONDS_PER_CHARACTER for start in starts],
+    }
+    frames = max(1, round(len(text) * _SECONDS_PER_CHARACTER / _MP3_FRAME_SECONDS))
+    return _MP3_FRAME * frames, alignment
+
+
+class ElevenLabsStub(StubServer):
+    """
+    ElevenLabs stand-in for text to speech with timestamps, both the
+    single-response and the streaming endpoint.
+    """
+
+    # Lines per streamed response
+    STREAM_PARTS = 4
+
+    def handle(self, method: str, path: str, headers, body: bytes) -> Reply:
+        text = json.loads(body or b"{}").get("text", "")
+        audio, alignment = synthesize(text)
+        if "/stream/" not in path:
+            return _jsonReply({
+                "audio_base64": base64.b64encode(audio).decode("ascii"),
+                "alignment": alignment,
+                "normalized_alignment": alignment,
+            })
+
+        lines = []
+        audio_step = -(-len(audio) // self.STREAM_PARTS)
+        char_step = -(-len(text) // self.STREAM_PARTS) or 1
+        for part in range(self.STREAM_PARTS):
+            chars = slice(part * char_step, (part + 1) * char_step)
+            part_alignment = {name: values[chars] for name, values in alignment.items()}
+            lines.append(json.dumps({
+                "audio_base64": base64.b64encode(audio[part * audio_step:(part + 1) * audio_step]).decode("ascii"),
+                "alignment": part_alignment,
+                "normalized_alignment": part_alignment,
+            }))
+        return 200, {"Content-Type": "application/x-ndjson"}, "\n".join(lines).encode("utf-8")
@@ -0,0 +1,127 @@
+import base64
+from typing import Optional
+
+# MPEG audio Layer III frame header tables, indexed by the header's version bits
+# (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+_BITRATES_KBPS = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+# VBR/LAME info frames carry metadata, not audio
+_INFO_FRAME_TAGS = (b"Xing", b"Info")
+
+
+def _id3v2Size(data: bytes) -> int:
+    """Length of a leading ID3v2 tag, or 0 if there is none"""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return 10 + size
+
+
+def _parseFrameHeader(data: bytes, position: int) -> Optional[tuple]:
+    """Return (frame length, samples, sample rate) for a Layer III frame header at position"""
+    if position + 4 > len(data) or data[position] != 0xFF or data[position + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[position + 1] >> 3) & 0x03
+    layer = (data[position + 1] >> 1) & 0x03
+    bitrate_index = data[position + 2] >> 4
+    sample_rate_index = (data[position + 2] >> 2) & 0x03
+    padding = (data[position + 2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate = _BITRATES_KBPS[version][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    samples = 1152 if version == 3 else 576
+    frame_length = (samples // 8) * bitrate // sample_rate + padding
+    return frame_length, samples, sample_rate
+
+
+class Mp3DurationCounter:
+    """
+    Measures the duration of MP3 audio fed to it in arbitrary pieces, by
+    walking its frame headers.
+
+    Bytes that are not part of a valid frame (tags, garbage between frames)
+    are skipped, and VBR info frames are not counted. Only a partial frame
+    is buffered between calls.
+    """
+
+    def __init__(self):
+        self.duration = 0.0
+        self._buffer = b""
+        self._skip = 0
+        self._started = False
+
+    def feed(self, data: bytes) -> None:
+        if self._skip:
+            skipped = min(self._skip, len(data))
+            self._skip -= skipped
+            data = data[skipped:]
+        buffer = self._buffer + data
+        position = 0
+        if not self._started:
+            if len(buffer) < 10:
+                self._buffer = buffer
+                return
+            position = _id3v2Size(buffer)
+            self._started = True
+
+        while position + 4 <= len(buffer):
+            header = _parseFrameHeader(buffer, position)
+            if header is None:
+                position += 1
+                continue
+            frame_length, samples, sample_rate = header
+            if position + frame_length > len(buffer):
+                break
+            if not any(tag in buffer[position:position + 48] for tag in _INFO_FRAME_TAGS):
+                self.duration += samples / sample_rate
+            position += frame_length
+
+        if position > len(buffer):
+            self._skip = position - len(buffer)
+        self._buffer = buffer[position:]
+
+
+def mp3Duration(data: bytes) -> float:
+    """Duration in seconds of MP3 audio, computed by walking its frame headers"""
+    counter = Mp3DurationCounter()
+    counter.feed(data)
+    return counter.duration
+
+
+class Base64StreamDecoder:
+    """
+    Decodes base64 text that arrives in pieces of arbitrary length.
+
+    Characters that don't complete a 4-character group are held back until
+    the next piece, so only whole groups are decoded.
+    """
+
+    def __init__(self):
+        self._pending = ""
+
+    def decode(self, text: str) -> bytes:
+        data = self._pending + text
+        if data.endswith("="):
+            # Padding ends a base64 string; the next piece starts a new one
+            self._pending = ""
+            return base64.b64decode(data)
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        return base64.b64decode(data[:usable])
+
+    def finish(self) -> bytes:
+        """Decode whatever is left, tolerating missing padding"""
+        pending, self._pending = self._pending, ""
+        if not pending:
+            return b""
+        return base64.b64decode(pending + "=" * (-len(pending) % 4))
@@ -0,0 +1,172 @@
+import re
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional
+
+# Section markers emitted by the document extractors, e.g.
+# "--- Page 3 Text ---", "--- Slide 12 ---" or "--- Sheet: Q1 ---".
+# OCR markers ("--- Page 3 Image 1 OCR ---") belong to their page and are
+# deliberately not boundaries.
+SECTION_MARKER_PATTERN = re.compile(r'--- (?:Page \d+ Text|Slide \d+|Sheet: .*?) ---')
+_SECTION_BOUNDARY_PATTERN = re.compile(r'(?=' + SECTION_MARKER_PATTERN.pattern + r')')
+_SENTENCE_BOUNDARY_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+# Average characters per token for English text with OpenAI tokenizers
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _getEncoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:  # tiktoken is optional, fall back to a character estimate
+        return None
+
+
+def estimateTokens(text: str) -> int:
+    """Count tokens with tiktoken when available, otherwise estimate them"""
+    encoding = _getEncoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def splitSections(text: str) -> List[str]:
+    """Split text on page, slide and sheet markers, keeping each marker with its section"""
+    return [section.strip() for section in _SECTION_BOUNDARY_PATTERN.split(text) if section.strip()]
+
+
+def _splitOversized(section: str, max_tokens: int) -> List[str]:
+    """Split a single section that exceeds max_tokens on sentences, then words"""
+    pieces = []
+    for sentence in _SENTENCE_BOUNDARY_PATTERN.split(section):
+        if estimateTokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        words = sentence.split()
+        step = max(1, max_tokens * _CHARS_PER_TOKEN // 8)
+        pieces.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+    return pieces
+
+
+class ChunkPacker:
+    """
+    Incrementally packs sections into chunks of at most max_tokens.
+
+    Chunks are handed out as soon as they are complete, so they can be
+    processed while later sections are still being extracted. Sections may
+    be labelled (e.g. with a page fingerprint); chunk_labels holds the labels
+    of the sections in each chunk handed out so far.
+    """
+
+    def __init__(self, max_tokens: int):
+        self.max_tokens = max_tokens
+        self.chunk_labels: List[List[Any]] = []
+        self._current: List[str] = []
+        self._current_labels: List[Any] = []
+        self._current_tokens = 0
+
+    def add(self, section: str, label: Optional[Any] = None) -> List[str]:
+        """Add a section and return the chunks it completed"""
+        section_tokens = estimateTokens(section)
+        if section_tokens <= self.max_tokens:
+            pieces = [(section, section_tokens)]
+        else:
+            pieces = [(piece, estimateTokens(piece)) for piece in _splitOversized(section, self.max_tokens)]
+
+        completed = []
+        for piece, piece_tokens in pieces:
+            if self._current and self._current_tokens + piece_tokens > self.max_tokens:
+                completed.append(self._flush())
+            self._current.append(piece)
+            self._current_tokens += piece_tokens
+            if label is not None and label not in self._current_labels:
+                self._current_labels.append(label)
+        return completed
+
+    def finish(self) -> List[str]:
+        """Return the last, partially filled chunk if there is one"""
+        return [self._flush()] if self._current else []
+
+    def _flush(self) -> str:
+        chunk = " ".join(self._current)
+        self.chunk_labels.append(self._current_labels)
+        self._current = []
+        self._current_labels = []
+        self._current_tokens = 0
+        return chunk
+
+
+def splitIntoChunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens.
+
+    Whole pages, slides and sheets are packed together where they fit. A
+    section that is too large on its own is split on sentence boundaries,
+    and as a last resort on word boundaries.
+
+    Args:
+        text: Text to split
+        max_tokens: Token budget per chunk
+
+    Returns:
+        List of chunks in document order
+    """
+    if not text:
+        return []
+    if estimateTokens(text) <= max_tokens:
+        return [text]
+
+    packer = ChunkPacker(max_tokens)
+    chunks = []
+    for section in splitSections(text):
+        chunks.extend(packer.add(section))
+    chunks.extend(packer.finish())
+    return chunks
+
+
+def packSentences(text: str, max_chars: int) -> List[str]:
+    """
+    Split text into chunks of at most max_chars, breaking only between sentences.
+
+    Sentences longer than max_chars are split on word boundaries.
+
+    Args:
+        text: Text to split
+        max_chars: Character budget per chunk
+
+    Returns:
+        List of chunks in order
+    """
+    chunks = []
+    current = ""
+    for sentence in _SENTENCE_BOUNDARY_PATTERN.split(text.strip()):
+        pieces = [sentence]
+        if len(sentence) > max_chars:
+            pieces = []
+            for word in sentence.split():
+                if pieces and len(pieces[-1]) + 1 + len(word) <= max_chars:
+                    pieces[-1] += " " + word
+                else:
+                    pieces.append(word)
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def mergeTopics(topic_lists: Iterable[List[str]]) -> List[str]:
+    """Merge per-chunk topic lists, dropping case-insensitive duplicates and keeping first-seen order"""
+    seen = set()
+    merged = []
+    for topics in topic_lists:
+        for topic in topics:
+            normalized = " ".join(topic.split()).casefold()
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                merged.append(topic)
+    return merged
@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -18,14 +18,147 @@ class Settings:
     AWS_S3_REGION: str = os.environ.get("AWS_S3_REGION")
     AWS_S3_EXERCISES_BUCKET: str = os.environ.get("AWS_S3_EXERCISES_BUCKET")
     AWS_S3_FILES_BUCKET: str = os.environ.get("AWS_S3_FILES_BUCKET")
+    # S3-compatible endpoint (e.g. MinIO or the benchmark stand-in); unset for AWS
+    AWS_S3_ENDPOINT_URL: str = os.environ.get("AWS_S3_ENDPOINT_URL")
+
+    # S3 I/O Settings
+    # boto3 is synchronous, so S3 calls are dispatched to a bounded thread pool
+    # sharing one HTTP connection pool instead of blocking the event loop.
+    S3_MAX_WORKERS: int = int(os.environ.get("S3_MAX_WORKERS", "16"))
+    S3_MAX_POOL_CONNECTIONS: int = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", "32"))
+    S3_CONNECT_TIMEOUT: float = float(os.environ.get("S3_CONNECT_TIMEOUT", "5"))
+    S3_READ_TIMEOUT: float = float(os.environ.get("S3_READ_TIMEOUT", "60"))
+    S3_MAX_RETRIES: int = int(os.environ.get("S3_MAX_RETRIES", "3"))
+    # Downloads are read in chunks and spooled to a temp file once they exceed
+    # S3_SPOOL_MAX_MEMORY bytes, so large documents are never held in memory.
+    S3_STREAM_CHUNK_SIZE: int = int(os.environ.get("S3_STREAM_CHUNK_SIZE", str(1024 * 1024)))
+    S3_SPOOL_MAX_MEMORY: int = int(os.environ.get("S3_SPOOL_MAX_MEMORY", str(16 * 1024 * 1024)))
+    # Part size for multipart uploads of incrementally produced content (min 5 MiB)
+    S3_MULTIPART_PART_SIZE: int = int(os.environ.get("S3_MULTIPART_PART_SIZE", str(8 * 1024 * 1024)))
+
+    # Presigned URL Settings
+    # Clients upload source documents and download generated audio directly
+    # from S3 with presigned URLs that expire after S3_PRESIGNED_URL_EXPIRES seconds.
+    # The URLs are minted for the Wasp server, which authenticates with
+    # "Authorization: Bearer <PRESIGN_API_SECRET>" and hands them to its
+    # logged-in user; the endpoints are disabled while the secret is unset.
+    PRESIGN_API_SECRET: Optional[str] = os.environ.get("PRESIGN_API_SECRET") or None
+    S3_PRESIGNED_URL_EXPIRES: int = int(os.environ.get("S3_PRESIGNED_URL_EXPIRES", "900"))
+    # Uploads are stored under {S3_UPLOAD_PREFIX}{user_id}/ with keys chosen by the service
+    S3_UPLOAD_PREFIX: str = os.environ.get("S3_UPLOAD_PREFIX", "uploads/")
+    # Largest file a client may upload, in bytes
+    S3_UPLOAD_MAX_BYTES: int = int(os.environ.get("S3_UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+    # Most parts a client may request for a presigned multipart upload (S3 allows 10000)
+    S3_PRESIGNED_MAX_PARTS: int = int(os.environ.get("S3_PRESIGNED_MAX_PARTS", "10000"))
+
+    # Extraction Cache Settings
+    # Extraction results are cached by document content hash, in memory and
+    # as JSON objects under EXTRACTION_CACHE_PREFIX in the exercises bucket.
+    EXTRACTION_CACHE_ENABLED: bool = os.environ.get("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+    EXTRACTION_CACHE_MAX_ITEMS: int = int(os.environ.get("EXTRACTION_CACHE_MAX_ITEMS", "256"))
+    EXTRACTION_CACHE_MAX_BYTES: int = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    EXTRACTION_CACHE_PREFIX: str = os.environ.get("EXTRACTION_CACHE_PREFIX", "cache/extractions/")
+
+    # Audio Cache Settings
+    # Synthesized audio and word timestamps are cached under AUDIO_CACHE_PREFIX
+    # by a hash of the text, voice, model and output format.
+    AUDIO_CACHE_ENABLED: bool = os.environ.get("AUDIO_CACHE_ENABLED", "true").lower() == "true"
+    AUDIO_CACHE_PREFIX: str = os.environ.get("AUDIO_CACHE_PREFIX", "cache/audio/")
 
     # Database Settings
     DATABASE_URL: str = os.environ.get("DATABASE_URL")
+    # Pool sizing applies to the sync and the async (asyncpg) engine alike
+    DB_POOL_SIZE: int = int(os.environ.get("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+    # Exercise IDs known to exist are remembered for this many seconds (0 disables).
+    # Exercises are deleted by the Wasp app through Prisma, which this service
+    # doesn't see, so a deleted exercise still counts as existing for up to
+    # this long: audio generated for it in that window is stored but unused.
+    EXERCISE_EXISTS_CACHE_TTL: float = float(os.environ.get("EXERCISE_EXISTS_CACHE_TTL", "60"))
+    EXERCISE_EXISTS_CACHE_MAX_ITEMS: int = int(os.environ.get("EXERCISE_EXISTS_CACHE_MAX_ITEMS", "10000"))
+    # Async audio timestamp updates are buffered and written together, after
+    # DB_WRITE_BUFFER_DELAY seconds or once DB_WRITE_BUFFER_MAX_ITEMS are pending (0 delay disables)
+    DB_WRITE_BUFFER_DELAY: float = float(os.environ.get("DB_WRITE_BUFFER_DELAY", "0.05"))
+    DB_WRITE_BUFFER_MAX_ITEMS: int = int(os.environ.get("DB_WRITE_BUFFER_MAX_ITEMS", "50"))
+
+    # Health Check Settings
+    # Dependency probes run concurrently, each limited to HEALTH_CHECK_TIMEOUT
+    # seconds, and their results are cached for HEALTH_CHECK_CACHE_TTL seconds
+    HEALTH_CHECK_TIMEOUT: float = float(os.environ.get("HEALTH_CHECK_TIMEOUT", "2"))
+    HEALTH_CHECK_CACHE_TTL: float = float(os.environ.get("HEALTH_CHECK_CACHE_TTL", "5"))
 
     # API Keys
     ELEVENLABS_API_KEY: str = os.environ.get("ELEVENLABS_API_KEY")
 
+    # ElevenLabs Settings
+    # API base URL, e.g. the benchmark stand-in; unset for the production API
+    ELEVENLABS_BASE_URL: str = os.environ.get("ELEVENLABS_BASE_URL")
+    # Text is split on sentence boundaries into chunks of at most
+    # ELEVENLABS_CHUNK_MAX_CHARS that are synthesized concurrently
+    ELEVENLABS_MAX_CONCURRENT_REQUESTS: int = int(os.environ.get("ELEVENLABS_MAX_CONCURRENT_REQUESTS", "4"))
+    ELEVENLABS_CHUNK_MAX_CHARS: int = int(os.environ.get("ELEVENLABS_CHUNK_MAX_CHARS", "2500"))
+    ELEVENLABS_TIMEOUT: float = float(os.environ.get("ELEVENLABS_TIMEOUT", "600"))
+    ELEVENLABS_MAX_RETRIES: int = int(os.environ.get("ELEVENLABS_MAX_RETRIES", "2"))
+    # "parallel" synthesizes all chunks at once and uploads the joined audio;
+    # "streaming" synthesizes chunks in order and uploads the audio to S3 in
+    # parts as it arrives, keeping memory flat for long lessons
+    ELEVENLABS_SYNTHESIS_MODE: str = os.environ.get("ELEVENLABS_SYNTHESIS_MODE", "parallel").lower()
+    # Where word timestamps are written: "db" stores one JSON string per word
+    # in Exercise.audio_timestamps, "s3" stores a compact binary blob next to
+    # the MP3 as {exercise_id}.timestamps.bin, "both" does both
+    AUDIO_TIMESTAMPS_STORAGE: str = os.environ.get("AUDIO_TIMESTAMPS_STORAGE", "db").lower()
+
+    # Audio Job Settings
+    # Audio generation runs in the background on AUDIO_JOB_WORKERS workers.
+    # Submissions are rejected with 429 once AUDIO_JOB_MAX_IN_FLIGHT jobs are
+    # queued or running; finished jobs are kept for AUDIO_JOB_RETENTION seconds.
+    AUDIO_JOB_WORKERS: int = int(os.environ.get("AUDIO_JOB_WORKERS", "2"))
+    AUDIO_JOB_MAX_IN_FLIGHT: int = int(os.environ.get("AUDIO_JOB_MAX_IN_FLIGHT", "20"))
+    AUDIO_JOB_RETENTION: float = float(os.environ.get("AUDIO_JOB_RETENTION", "3600"))
+
+    # OpenAI Settings
+    OPENAI_MAX_CONCURRENT_REQUESTS: int = int(os.environ.get("OPENAI_MAX_CONCURRENT_REQUESTS", "8"))
+    OPENAI_TIMEOUT: float = float(os.environ.get("OPENAI_TIMEOUT", "300"))
+    # Documents larger than this are split into chunks whose topics are
+    # extracted concurrently and merged
+    OPENAI_CHUNK_MAX_TOKENS: int = int(os.environ.get("OPENAI_CHUNK_MAX_TOKENS", "8000"))
+
     # Tika Settings
     TIKA_SERVER_ENDPOINT: str = os.environ.get("TIKA_SERVER_ENDPOINT")
 
+    # Extraction Settings
+    # "auto" parses PDF/PPTX/XLSX in-process and falls back to Tika,
+    # "local" only uses the in-process extractors, "tika" only uses Tika.
+    EXTRACTION_BACKEND: str = os.environ.get("EXTRACTION_BACKEND", "auto").lower()
+    EXTRACTION_SCAN_IMAGES: bool = os.environ.get("EXTRACTION_SCAN_IMAGES", "false").lower() == "true"
+    # Local extraction runs in a pool of worker processes; 0 workers means one per CPU
+    EXTRACTION_POOL_ENABLED: bool = os.environ.get("EXTRACTION_POOL_ENABLED", "true").lower() == "true"
+    EXTRACTION_POOL_WORKERS: int = int(os.environ.get("EXTRACTION_POOL_WORKERS", "0"))
+    EXTRACTION_TASK_TIMEOUT: float = float(os.environ.get("EXTRACTION_TASK_TIMEOUT", "120"))
+    EXTRACTION_TIMEOUT_GRACE: float = float(os.environ.get("EXTRACTION_TIMEOUT_GRACE", "10"))
+    # Workers are replaced after this many tasks, or once their peak RSS
+    # exceeds the limit (0 disables either check)
+    EXTRACTION_WORKER_MAX_TASKS: int = int(os.environ.get("EXTRACTION_WORKER_MAX_TASKS", "50"))
+    EXTRACTION_WORKER_MAX_RSS_MB: int = int(os.environ.get("EXTRACTION_WORKER_MAX_RSS_MB", "1024"))
+    # PDFs are split into page ranges of this size that are extracted in parallel
+    EXTRACTION_PDF_PAGES_PER_TASK: int = int(os.environ.get("EXTRACTION_PDF_PAGES_PER_TASK", "25"))
+    # Page fingerprints are stored as {file_id}.pages.json next to the text, so
+    # a new version of a document only has its changed pages reprocessed
+    PAGE_MANIFEST_ENABLED: bool = os.environ.get("PAGE_MANIFEST_ENABLED", "true").lower() == "true"
+
+    # OCR Settings
+    # Threads running tesseract per process. OCR runs inside every extraction
+    # pool worker, so by default the CPUs are shared out between the workers.
+    OCR_MAX_WORKERS: int = int(os.environ.get("OCR_MAX_WORKERS", str(
+        max(1, (os.cpu_count() or 1) // (EXTRACTION_POOL_WORKERS or os.cpu_count() or 1))
+        if EXTRACTION_POOL_ENABLED else os.cpu_count() or 1
+    )))
+    OCR_LANGUAGES: str = os.environ.get("OCR_LANGUAGES", "eng")
+    # Images are downscaled to this longest side; smaller ones are skipped
+    OCR_MAX_IMAGE_DIMENSION: int = int(os.environ.get("OCR_MAX_IMAGE_DIMENSION", "2000"))
+    OCR_MIN_IMAGE_DIMENSION: int = int(os.environ.get("OCR_MIN_IMAGE_DIMENSION", "32"))
+    OCR_CACHE_MAX_ITEMS: int = int(os.environ.get("OCR_CACHE_MAX_ITEMS", "1024"))
+
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,216 @@
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+# Exposition format served at /api/metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers in-memory stages as well as minute-long syntheses
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Seconds; a pool checkout is normally well under a millisecond
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+M = TypeVar('M', bound="Metric")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatLabels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _formatValue(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base class for a metric family with a fixed set of label names.
+
+    Thread-safe, since some stages are observed from worker threads.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames) or set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {', '.join(self.labelnames)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterator[Tuple[str, Sequence[Tuple[str, str]], float]]:
+        """Yield (sample name suffix, label pairs, value) for every sample"""
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield "", tuple(zip(self.labelnames, key)), value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        for suffix, pairs, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_formatLabels(pairs)} {_formatValue(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. bytes processed"""
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down, e.g. operations in progress"""
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Counts observations, e.g. durations, into cumulative buckets"""
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then the sum
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time spent in the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> Iterator[Tuple[str, Sequence[Tuple[str, str]], float]]:
+        with self._lock:
+            values = [(key, list(series)) for key, series in self._values.items()]
+        for key, series in values:
+            pairs = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                yield "_bucket", pairs + (("le", _formatValue(bound)),), cumulative
+            yield "_sum", pairs, series[-1]
+            yield "_count", pairs, cumulative
+
+
+class MetricsRegistry:
+    """
+    The metrics exposed at /api/metrics.
+
+    Collectors are called before every render, to refresh gauges that are
+    read from another object, such as the database connection pools.
+    """
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def addCollector(self, collector: Callable[[], None]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.register(Histogram(
+    "docflow_stage_duration_seconds", "Duration of each processing stage", ["service", "stage"]))
+STAGE_ERRORS = registry.register(Counter(
+    "docflow_stage_errors_total", "Processing stages that raised an error", ["service", "stage"]))
+IN_FLIGHT = registry.register(Gauge(
+    "docflow_in_flight", "Processing stages currently running", ["service", "stage"]))
+BYTES_PROCESSED = registry.register(Counter(
+    "docflow_bytes_processed_total", "Bytes read or written by each service", ["service", "direction"]))
+CACHE_LOOKUPS = registry.register(Counter(
+    "docflow_cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"]))
+DB_POOL_WAIT = registry.register(Histogram(
+    "docflow_db_pool_wait_seconds", "Time spent checking out a database connection from the pool",
+    ["engine"], buckets=POOL_WAIT_BUCKETS))
+DB_POOL_CONNECTIONS = registry.register(Gauge(
+    "docflow_db_pool_connections", "Database pool connections by state", ["engine", "state"]))
+AUDIO_JOBS = registry.register(Gauge(
+    "docflow_audio_jobs", "Audio generation jobs by status", ["status"]))
+
+
+@contextmanager
+def timeStage(service: str, stage: str, timings: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    """
+    Record the duration of a stage, count it as in flight while it runs and
+    count it as an error if it raises (cancellation is not an error).
+
+    If timings is given, the duration in seconds is also stored in it under
+    the stage name, e.g. for the Server-Timing header.
+
+    Usage:
+        with timeStage("s3", "upload"):
+            await ...
+    """
+    IN_FLIGHT.inc(service=service, stage=stage)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(service=service, stage=stage)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_DURATION.observe(duration, service=service, stage=stage)
+        IN_FLIGHT.dec(service=service, stage=stage)
+        if timings is not None:
+            timings[stage] = duration
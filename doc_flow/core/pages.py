@@ -0,0 +1,140 @@
+import hashlib
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+# Bump when a change to extraction or filtering makes the pages and topics
+# recorded in earlier manifests unusable for new versions of a document
+PAGE_MANIFEST_VERSION = "v1"
+
+
+class ExtractedPage(NamedTuple):
+    """
+    Text of one page, slide or sheet and the fingerprint of its content.
+
+    text is None when the page was skipped because its fingerprint was
+    already known; fingerprint is None when the text isn't split into pages
+    (e.g. text extracted by Tika).
+    """
+    fingerprint: Optional[str]
+    text: Optional[str]
+
+
+class ManifestChunk(NamedTuple):
+    """Fingerprints of the pages in a topic extraction chunk and the topics extracted from it"""
+    pages: List[str]
+    topics: List[str]
+
+
+def pageFingerprint(text: str, images: Iterable[bytes] = ()) -> str:
+    """
+    Fingerprint the content of a page: its text layer and its images.
+
+    Page numbers are not part of it, so a page keeps its fingerprint when
+    pages are inserted or removed before it.
+    """
+    digest = hashlib.sha256(text.encode('utf-8'))
+    for image in images:
+        digest.update(hashlib.sha256(image).digest())
+    return digest.hexdigest()
+
+
+def manifestKey(file_id: str) -> str:
+    """S3 key of the page manifest stored next to a document's {file_id}.txt"""
+    return f"{file_id}.pages.json"
+
+
+class PageManifest:
+    """
+    Where each page of a processed document is in its cleaned text, by
+    fingerprint, and the topics extracted from each chunk of pages.
+
+    A new version of the document is diffed against it: unchanged pages
+    needn't be extracted again, and chunks whose pages are all unchanged
+    needn't be sent for topic extraction again.
+    """
+
+    def __init__(self, file_type: str, scan_images: bool,
+                 pages: Optional[List[Tuple[str, int, int]]] = None,
+                 chunks: Optional[List[ManifestChunk]] = None):
+        self.file_type = file_type
+        self.scan_images = scan_images
+        # (fingerprint, offset, length) of each page in the cleaned text
+        self.pages = pages or []
+        self.chunks = chunks or []
+
+    @classmethod
+    def fromPages(cls, file_type: str, scan_images: bool,
+                  cleaned_pages: Sequence[Tuple[str, str]]) -> "PageManifest":
+        """Describe the cleaned pages, as joined with single spaces into the document text"""
+        pages = []
+        offset = 0
+        for fingerprint, text in cleaned_pages:
+            pages.append((fingerprint, offset, len(text)))
+            offset += len(text) + 1
+        return cls(file_type, scan_images, pages)
+
+    def matches(self, file_type: str, scan_images: bool) -> bool:
+        """Whether fingerprints of a document extracted this way are comparable with this manifest's"""
+        return self.file_type == file_type and self.scan_images == scan_images
+
+    def pageTexts(self, text: str) -> Dict[str, str]:
+        """
+        Map each page's fingerprint to its cleaned text.
+
+        Raises:
+            ValueError: If the text doesn't belong to this manifest
+        """
+        page_texts = {}
+        for fingerprint, offset, length in self.pages:
+            if offset + length > len(text):
+                raise ValueError("Page manifest does not match the document text")
+            page_texts[fingerprint] = text[offset:offset + length]
+        return page_texts
+
+    def reusableChunks(self, fingerprints: Set[str]) -> Tuple[List[ManifestChunk], Set[str]]:
+        """
+        Find the chunks whose topics still hold for a document with the given
+        page fingerprints: those whose pages are all still in it.
+
+        Returns:
+            The reusable chunks, and the fingerprints of the pages fully
+            covered by them. A page split across several chunks is only
+            covered if all of them are reusable.
+        """
+        reusable = []
+        covered = set()
+        uncovered = set()
+        for chunk in self.chunks:
+            if all(fingerprint in fingerprints for fingerprint in chunk.pages):
+                reusable.append(chunk)
+                covered.update(chunk.pages)
+            else:
+                uncovered.update(chunk.pages)
+        return reusable, covered - uncovered
+
+    def toDict(self) -> Dict:
+        return {
+            "version": PAGE_MANIFEST_VERSION,
+            "file_type": self.file_type,
+            "scan_images": self.scan_images,
+            "pages": [{"fingerprint": fingerprint, "offset": offset, "length": length}
+                      for fingerprint, offset, length in self.pages],
+            "chunks": [{"pages": chunk.pages, "topics": chunk.topics} for chunk in self.chunks],
+        }
+
+    @classmethod
+    def fromDict(cls, payload: Dict) -> "PageManifest":
+        """
+        Raises:
+            ValueError: If the manifest is malformed or from another version
+        """
+        try:
+            if payload["version"] != PAGE_MANIFEST_VERSION:
+                raise ValueError(f"Unsupported page manifest version: {payload['version']}")
+            pages = [(str(page["fingerprint"]), int(page["offset"]), int(page["length"]))
+                     for page in payload["pages"]]
+            chunks = [ManifestChunk([str(fingerprint) for fingerprint in chunk["pages"]],
+                                    [str(topic) for topic in chunk["topics"]])
+                      for chunk in payload["chunks"]]
+            return cls(str(payload["file_type"]), bool(payload["scan_images"]), pages, chunks)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Malformed page manifest: {str(e)}")
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from core.metrics import timeStage
+
+
+class StageGraph:
+    """
+    Runs named async stages, each as soon as the stages it depends on are done.
+
+    Independent stages run concurrently. If any stage fails, the stages still
+    running are cancelled, the ones not yet started never start, and the
+    failure is re-raised. The wall-clock duration of every finished stage is
+    recorded in timings, in seconds, and, if service is given, in the stage
+    metrics under that service name.
+    """
+
+    def __init__(self, service: Optional[str] = None):
+        self.service = service
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, func: Callable[..., Awaitable[Any]], after: Iterable[str] = ()) -> None:
+        """
+        Add a stage.
+
+        Args:
+            name: Stage name, also used in timings
+            func: Coroutine function called with the results of the stages in after, in order
+            after: Names of the stages that must finish first
+        """
+        after = tuple(after)
+        unknown = [dependency for dependency in after if dependency not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(unknown)}")
+        self._stages[name] = (func, after)
+
+    async def _runStage(self, name: str, tasks: Dict[str, "asyncio.Task"]) -> Any:
+        func, after = self._stages[name]
+        arguments = [await tasks[dependency] for dependency in after]
+        started = time.perf_counter()
+        if self.service is not None:
+            with timeStage(self.service, name):
+                result = await func(*arguments)
+        else:
+            result = await func(*arguments)
+        self.timings[name] = time.perf_counter() - started
+        self.results[name] = result
+        return result
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run every stage.
+
+        Returns:
+            The result of each stage by name
+        """
+        # Stages can only depend on stages added before them, so creating the
+        # tasks in insertion order always finds the dependencies' tasks
+        tasks: Dict[str, asyncio.Task] = {}
+        for name in self._stages:
+            tasks[name] = asyncio.ensure_future(self._runStage(name, tasks))
+
+        pending: List[asyncio.Task] = list(tasks.values())
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    if not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        return dict(self.results)
+
+
+def serverTiming(timings: Dict[str, float]) -> str:
+    """Format stage timings, in seconds, as a Server-Timing header value"""
+    return ", ".join(f"{name};dur={duration * 1000:.1f}" for name, duration in timings.items())
@@ -0,0 +1,220 @@
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, List, NamedTuple, Tuple, Union
+from core.timestamps import WordTimestamps
+
+# Compact binary format for word timestamps:
+#
+#   header   "MXTS", format version (uint8), word count (uint32),
+#            words per block (uint32), block count (uint32), little-endian
+#   index    one entry per block: compressed size (uint32) and the start
+#            time of its first word (float64)
+#   blocks   each block is zlib-compressed on its own and holds the columns
+#            of up to BLOCK_WORDS words: start times (float64), end times
+#            (float64), UTF-8 byte length of each word (uint32), then the
+#            UTF-8 words
+#
+# Storing columns rather than one JSON object per word lets zlib compress the
+# slowly increasing times and the repetitive vocabulary well, typically to a
+# fraction of the size of the JSON strings. Because every block decodes on
+# its own, a client can fetch the header and index with one byte range and
+# then only the blocks around the playback position.
+#
+# Versions 1 and 2 stored all columns in a single zlib stream after a
+# "MXTS", version, word count header, with float32 and float64 times
+# respectively; both are still decoded.
+MAGIC = b"MXTS"
+FORMAT_VERSION = 3
+BLOCK_WORDS = 1024
+# Type code of the time columns by format version
+_TIME_TYPECODES = {1: 'f', 2: 'd', 3: 'd'}
+_LEGACY_HEADER = struct.Struct("<4sBI")
+_HEADER = struct.Struct("<4sBIII")
+_INDEX_ENTRY = struct.Struct("<Id")
+HEADER_SIZE = _HEADER.size
+_BIG_ENDIAN = sys.byteorder == "big"
+CONTENT_TYPE = "application/vnd.multinex.timestamps"
+
+
+class BlockIndex(NamedTuple):
+    """Where each block of a timestamps blob is and which words it holds"""
+    word_count: int
+    block_words: int
+    # Byte offset of each block in the blob, followed by the end of the last block
+    offsets: List[int]
+    # Start time of the first word of each block
+    first_starts: List[float]
+
+    def blockOf(self, seconds: float) -> int:
+        """Number of the block holding the word spoken at the given time"""
+        return max(bisect_right(self.first_starts, seconds) - 1, 0)
+
+    def blockRange(self, block: int) -> Tuple[int, int]:
+        """Inclusive byte range of a block, as used in a Range header"""
+        return self.offsets[block], self.offsets[block + 1] - 1
+
+    def wordCount(self, block: int) -> int:
+        """Number of words in a block"""
+        return min(self.block_words, self.word_count - block * self.block_words)
+
+
+def _toLittleEndian(values: array) -> bytes:
+    if _BIG_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _fromLittleEndian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if _BIG_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def _encodeBlock(encoded_words: List[bytes], starts: array, ends: array) -> bytes:
+    return zlib.compress(b"".join([
+        _toLittleEndian(starts),
+        _toLittleEndian(ends),
+        _toLittleEndian(array('I', map(len, encoded_words))),
+        b"".join(encoded_words),
+    ]), 6)
+
+
+def encodeTimestamps(timestamps: Union[List[Dict], WordTimestamps]) -> bytes:
+    """
+    Encode word timestamps into the compact binary format.
+
+    Times are stored as float64, so they decode to exactly the values
+    that were encoded.
+    """
+    if not isinstance(timestamps, WordTimestamps):
+        timestamps = WordTimestamps.fromDicts(timestamps)
+
+    encoded_words = [word.encode("utf-8") for word in timestamps.words]
+    blocks = []
+    index = []
+    for first in range(0, len(encoded_words), BLOCK_WORDS):
+        last = first + BLOCK_WORDS
+        block = _encodeBlock(encoded_words[first:last], timestamps.starts[first:last], timestamps.ends[first:last])
+        blocks.append(block)
+        index.append(_INDEX_ENTRY.pack(len(block), timestamps.starts[first]))
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(encoded_words), BLOCK_WORDS, len(blocks))
+    return b"".join([header, *index, *blocks])
+
+
+def indexSize(header: bytes) -> int:
+    """
+    Number of bytes at the start of a blob that readBlockIndex needs.
+
+    Only the first HEADER_SIZE bytes of the blob have to be passed.
+
+    Raises:
+        ValueError: If the data is not the header of a format 3 blob
+    """
+    _, _, block_count = _readHeader(header)
+    return _HEADER.size + _INDEX_ENTRY.size * block_count
+
+
+def readBlockIndex(data: bytes) -> BlockIndex:
+    """
+    Read the block index of a blob from its first indexSize() bytes.
+
+    Raises:
+        ValueError: If the data is not the start of a format 3 blob
+    """
+    word_count, block_words, block_count = _readHeader(data)
+    index_end = _HEADER.size + _INDEX_ENTRY.size * block_count
+    if len(data) < index_end:
+        raise ValueError("Timestamps blob is truncated")
+    entries = list(_INDEX_ENTRY.iter_unpack(data[_HEADER.size:index_end]))
+    offsets = list(accumulate((size for size, _ in entries), initial=index_end))
+    return BlockIndex(word_count, block_words, offsets, [start for _, start in entries])
+
+
+def decodeTimestampBlock(index: BlockIndex, block: int, data: bytes) -> WordTimestamps:
+    """
+    Decode one block of a blob, given the bytes of its blockRange().
+
+    Raises:
+        ValueError: If the block is corrupt or out of range
+    """
+    if not 0 <= block < len(index.first_starts):
+        raise ValueError(f"Timestamps block {block} out of range")
+    return WordTimestamps.fromColumns(*_decodeColumns(data, index.wordCount(block), 'd'))
+
+
+def decodeTimestamps(data: bytes) -> WordTimestamps:
+    """
+    Decode a blob produced by encodeTimestamps.
+
+    Raises:
+        ValueError: If the data is not a valid timestamps blob
+    """
+    if len(data) < _LEGACY_HEADER.size:
+        raise ValueError("Timestamps blob is truncated")
+    magic, version, word_count = _LEGACY_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a timestamps blob")
+    if version not in _TIME_TYPECODES:
+        raise ValueError(f"Unsupported timestamps format version: {version}")
+    if version < 3:
+        words, starts, ends = _decodeColumns(data[_LEGACY_HEADER.size:], word_count, _TIME_TYPECODES[version])
+        return WordTimestamps.fromColumns(words, starts, ends)
+
+    index = readBlockIndex(data)
+    if len(data) != index.offsets[-1]:
+        raise ValueError("Timestamps blob is truncated")
+    words = []
+    starts = array('d')
+    ends = array('d')
+    for block in range(len(index.first_starts)):
+        block_start, block_end = index.blockRange(block)
+        block_words, block_starts, block_ends = _decodeColumns(
+            data[block_start:block_end + 1], index.wordCount(block), 'd')
+        words.extend(block_words)
+        starts.extend(block_starts)
+        ends.extend(block_ends)
+    return WordTimestamps.fromColumns(words, starts, ends)
+
+
+def _readHeader(data: bytes) -> Tuple[int, int, int]:
+    """Word count, words per block and block count of a format 3 header"""
+    if len(data) < _HEADER.size:
+        raise ValueError("Timestamps blob is truncated")
+    magic, version, word_count, block_words, block_count = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a timestamps blob")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Timestamps format version {version} has no block index")
+    if block_words == 0 or block_count != -(-word_count // block_words):
+        raise ValueError("Corrupt timestamps blob header")
+    return word_count, block_words, block_count
+
+
+def _decodeColumns(compressed: bytes, word_count: int, typecode: str) -> Tuple[List[str], array, array]:
+    """Decompress a columns payload into words, start times and end times"""
+    try:
+        payload = zlib.decompress(compressed)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt timestamps blob: {str(e)}")
+
+    time_size = array(typecode).itemsize * word_count
+    length_size = 4 * word_count
+    if len(payload) < 2 * time_size + length_size:
+        raise ValueError("Timestamps blob is truncated")
+    starts = _fromLittleEndian(typecode, payload[:time_size])
+    ends = _fromLittleEndian(typecode, payload[time_size:2 * time_size])
+    lengths = _fromLittleEndian('I', payload[2 * time_size:2 * time_size + length_size])
+
+    text = payload[2 * time_size + length_size:]
+    if len(text) != sum(lengths):
+        raise ValueError("Timestamps blob is truncated")
+    boundaries = list(accumulate(lengths, initial=0))
+    words = [text[boundaries[i]:boundaries[i + 1]].decode("utf-8") for i in range(word_count)]
+    return words, starts, ends
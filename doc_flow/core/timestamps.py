@@ -0,0 +1,155 @@
+import re
+from array import array
+from json.encoder import encode_basestring_ascii
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+_WORD_PATTERN = re.compile(r'\S+')
+
+
+def _pick(values: Sequence[float], indices: List[int]) -> tuple:
+    """Gather values at indices in C, without a Python-level loop"""
+    if not indices:
+        return ()
+    if len(indices) == 1:
+        return (values[indices[0]],)
+    return itemgetter(*indices)(values)
+
+
+class WordTimestamps:
+    """
+    Word-level timestamps in columnar form.
+
+    The words are kept as one text with the character offset of each word,
+    and the start and end times as arrays of doubles, instead of one dict
+    per word.
+    """
+
+    def __init__(self, text: str = "", offsets: Iterable[int] = (),
+                 lengths: Iterable[int] = (), starts: Iterable[float] = (),
+                 ends: Iterable[float] = ()):
+        self.text = text
+        self.offsets = array('l', offsets)
+        self.lengths = array('l', lengths)
+        self.starts = array('d', starts)
+        self.ends = array('d', ends)
+
+    @classmethod
+    def fromAlignment(cls, chars: Sequence[str], starts: Sequence[float],
+                      ends: Sequence[float], offset: float = 0.0) -> "WordTimestamps":
+        """
+        Group a character alignment into words, shifting times by offset seconds.
+
+        Word boundaries are found with a single regex pass over the joined
+        characters; a word starts at the start time of its first character
+        and ends at the end time of its last.
+        """
+        text = "".join(chars)
+        if len(text) != len(chars):
+            # Multi-codepoint "characters" would break the index mapping
+            return cls.fromDicts(_groupWords(chars, starts, ends, offset))
+
+        spans = [match.span() for match in _WORD_PATTERN.finditer(text)]
+        first_chars = [first for first, _ in spans]
+        lengths = [end - first for first, end in spans]
+        word_starts = _pick(starts, first_chars)
+        word_ends = _pick(ends, [end - 1 for _, end in spans])
+        if offset:
+            word_starts = [start + offset for start in word_starts]
+            word_ends = [end + offset for end in word_ends]
+        return cls(text, first_chars, lengths, word_starts, word_ends)
+
+    @classmethod
+    def fromDicts(cls, timestamps: Iterable[Dict]) -> "WordTimestamps":
+        """Build from a list of {"word", "start", "end"} dicts"""
+        words = []
+        starts = array('d')
+        ends = array('d')
+        for timestamp in timestamps:
+            words.append(timestamp["word"])
+            starts.append(timestamp["start"])
+            ends.append(timestamp["end"])
+        return cls.fromColumns(words, starts, ends)
+
+    @classmethod
+    def fromColumns(cls, words: List[str], starts: Iterable[float],
+                    ends: Iterable[float]) -> "WordTimestamps":
+        """Build from parallel lists of words, start times and end times"""
+        lengths = [len(word) for word in words]
+        offsets = []
+        position = 0
+        for length in lengths:
+            offsets.append(position)
+            position += length + 1
+        return cls(" ".join(words), offsets, lengths, starts, ends)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def words(self) -> List[str]:
+        text = self.text
+        return [text[offset:offset + length] for offset, length in zip(self.offsets, self.lengths)]
+
+    def extend(self, other: "WordTimestamps") -> None:
+        """Append the words of other, e.g. the next synthesized chunk"""
+        base = len(self.text) + 1 if self.text else 0
+        self.text = f"{self.text} {other.text}" if self.text else other.text
+        self.offsets.extend(offset + base for offset in other.offsets)
+        self.lengths.extend(other.lengths)
+        self.starts.extend(other.starts)
+        self.ends.extend(other.ends)
+
+    def __getitem__(self, index: int) -> Dict:
+        offset = self.offsets[index]
+        return {"word": self.text[offset:offset + self.lengths[index]],
+                "start": self.starts[index], "end": self.ends[index]}
+
+    def __iter__(self) -> Iterator[Dict]:
+        for word, start, end in zip(self.words, self.starts, self.ends):
+            yield {"word": word, "start": start, "end": end}
+
+    def toDicts(self) -> List[Dict]:
+        return list(self)
+
+    def toJsonStrings(self) -> List[str]:
+        """
+        Serialize each word to the same JSON string json.dumps would produce
+        for its dict, without building the dicts.
+        """
+        encode = encode_basestring_ascii
+        return [f'{{"word": {encode(word)}, "start": {start!r}, "end": {end!r}}}'
+                for word, start, end in zip(self.words, self.starts, self.ends)]
+
+
+def _groupWords(chars: Sequence[str], starts: Sequence[float], ends: Sequence[float],
+                offset: float = 0.0) -> List[Dict]:
+    """Character-by-character reference implementation of word grouping"""
+    timestamps = []
+    current_word = ""
+    word_start = 0
+
+    for i in range(len(chars)):
+        char = chars[i]
+
+        if char.isspace():
+            if current_word:
+                timestamps.append({
+                    "word": current_word,
+                    "start": word_start + offset,
+                    "end": ends[i - 1] + offset
+                })
+                current_word = ""
+        else:
+            if not current_word:
+                word_start = starts[i]
+            current_word += char
+
+    if current_word:
+        timestamps.append({
+            "word": current_word,
+            "start": word_start + offset,
+            "end": ends[-1] + offset
+        })
+
+    return timestamps
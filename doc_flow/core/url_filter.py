@@ -0,0 +1,76 @@
+import re
+
+# Patterns are applied in this order; each one sees the output of the previous
+# one, exactly like the original chain of re.sub calls.
+HTTP_URL_PATTERN = re.compile(
+    r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+DOMAIN_PATTERN = re.compile(
+    r'(?:www\.)?[a-zA-Z0-9-]+\.[a-zA-Z]{2,}(?:\.[a-zA-Z]{2,})?(?:/\S*)?')
+ARXIV_PATTERN = re.compile(r'arxiv:\d{4}\.\d{4,5}')
+SOURCE_PATTERN = re.compile(r'source:\s*[^\n]+')
+
+# Every DOMAIN_PATTERN match contains a dot followed by two letters. The
+# pattern starts with a literal, so the regex engine can skip ahead to
+# candidates instead of attempting a match at every character.
+_DOMAIN_CANDIDATE_PATTERN = re.compile(r'\.[a-zA-Z]{2}')
+_WHITESPACE_PATTERN = re.compile(r'\s')
+
+
+class UrlFilter:
+    """
+    Removes URLs, arXiv references and source attributions from text.
+
+    Produces exactly the same output as running the original six re.sub passes
+    in sequence, with far less work:
+
+    - The http(s), arXiv and source patterns start with literals and are only
+      run when the literal occurs in the text at all.
+    - The domain pattern can never match across whitespace, so it is only run
+      on the whitespace-delimited tokens that contain a candidate ".xx"
+      instead of being attempted at every position of the text.
+    - The YouTube pattern is not run: any "youtube.com/watch?v=..." is already
+      consumed by the domain pattern, and removals by that pattern cannot
+      assemble a new one.
+    - Whitespace is collapsed with str.split, which splits on exactly the
+      characters matched by the \\s class.
+
+    Passes are not merged into a single alternation because the result would
+    differ from the sequential passes whenever one removal exposes or hides a
+    match for a later pattern (e.g. "foo.http://a" or "source:\\n\\nfoo.com").
+    """
+
+    def filter(self, text: str) -> str:
+        if '://' in text:
+            text = HTTP_URL_PATTERN.sub('', text)
+        text = self._removeDomains(text)
+        if 'arxiv:' in text:
+            text = ARXIV_PATTERN.sub('', text)
+        if 'source:' in text:
+            text = SOURCE_PATTERN.sub('', text)
+        return ' '.join(text.split())
+
+    @staticmethod
+    def _removeDomains(text: str) -> str:
+        """Apply DOMAIN_PATTERN only to tokens that contain a candidate match"""
+        pieces = []
+        position = 0
+        candidate = _DOMAIN_CANDIDATE_PATTERN.search(text)
+        while candidate is not None:
+            token_start = candidate.start()
+            while token_start > position and not text[token_start - 1].isspace():
+                token_start -= 1
+            token_end_match = _WHITESPACE_PATTERN.search(text, candidate.end())
+            token_end = token_end_match.start() if token_end_match else len(text)
+
+            pieces.append(text[position:token_start])
+            pieces.append(DOMAIN_PATTERN.sub('', text[token_start:token_end]))
+            position = token_end
+            candidate = _DOMAIN_CANDIDATE_PATTERN.search(text, token_end)
+
+        if not pieces:
+            return text
+        pieces.append(text[position:])
+        return ''.join(pieces)
+
+
+url_filter = UrlFilter()
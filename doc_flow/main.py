@@ -5,8 +5,12 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from api.routes import router
 from api.health import router as health_router
+from api.metrics import router as metrics_router
 from core.config import settings
 from services.db_service import db_service
+from services.s3_service import s3_service
+from services.doc_service import extraction_pool
+from services.audio_job_service import audio_job_service
 
 # Configure logging
 logging.basicConfig(
@@ -68,10 +72,24 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # Include routers
 app.include_router(router, prefix="/api")
 app.include_router(health_router, prefix="/api")
+app.include_router(metrics_router, prefix="/api")
+
+
+@app.on_event("startup")
+async def handleStartup():
+    """Warm up the extraction workers before serving requests"""
+    if settings.EXTRACTION_POOL_ENABLED and extraction_pool is not None:
+        await extraction_pool.start()
 
 
 @app.on_event("shutdown")
 async def handleShutdown():
     """Cleanup on application shutdown"""
+    await audio_job_service.close()
+    await db_service.flushAsync()
     db_service.closeConnections()
+    await db_service.closeConnectionsAsync()
+    s3_service.close()
+    if extraction_pool is not None:
+        extraction_pool.close()
     logging.info("Application shutdown complete")
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from core.config import settings
+from core.metrics import AUDIO_JOBS, registry
+from fastapi import HTTPException
+from services.elevenlabs_service import elevenlabs_service
+
+logger = logging.getLogger(__name__)
+
+
+class AudioJobService:
+    """
+    Runs audio generation in the background.
+
+    Jobs are queued in memory and processed by AUDIO_JOB_WORKERS worker tasks,
+    so the HTTP request returns as soon as the job is accepted. The status of
+    each job can be polled with getJob.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AudioJobService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.elevenlabs_service = elevenlabs_service
+            self.jobs: Dict[str, Dict] = {}
+            self._queue: Optional["asyncio.Queue[Tuple[str, str]]"] = None
+            self._workers: List[asyncio.Task] = []
+            self._loop: Optional[asyncio.AbstractEventLoop] = None
+            self._in_flight = 0
+            registry.addCollector(self._collectMetrics)
+            self._initialized = True
+
+    def _ensureWorkers(self) -> None:
+        """Start the worker tasks on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._workers = [
+            loop.create_task(self._worker(), name=f"audio-job-worker-{i}")
+            for i in range(max(1, settings.AUDIO_JOB_WORKERS))
+        ]
+        self._in_flight = 0
+
+    def _collectMetrics(self) -> None:
+        """Refresh the job gauges before /api/metrics is rendered"""
+        counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+        for job in list(self.jobs.values()):
+            counts[job["status"]] += 1
+        for status, count in counts.items():
+            AUDIO_JOBS.set(count, status=status)
+
+    def _pruneJobs(self) -> None:
+        """Forget finished jobs older than AUDIO_JOB_RETENTION"""
+        cutoff = time.time() - settings.AUDIO_JOB_RETENTION
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+    async def submit(self, exercise_id: str, text: str) -> Dict:
+        """
+        Queue an audio generation job.
+
+        Args:
+            exercise_id: Exercise ID
+            text: Text to generate audio from
+
+        Returns:
+            The queued job
+
+        Raises:
+            HTTPException: 429 if too many jobs are already queued or running
+        """
+        self._ensureWorkers()
+        self._pruneJobs()
+        if self._in_flight >= settings.AUDIO_JOB_MAX_IN_FLIGHT:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many audio generation jobs in progress, retry later")
+
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "exercise_id": exercise_id,
+            "status": "queued",
+            "stage": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self.jobs[job_id] = job
+        self._in_flight += 1
+        self._queue.put_nowait((job_id, text))
+        return dict(job)
+
+    def getJob(self, job_id: str) -> Optional[Dict]:
+        """Return a snapshot of a job, or None if it is unknown or expired"""
+        job = self.jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, text = await self._queue.get()
+            job = self.jobs[job_id]
+            job["status"] = "running"
+            job["started_at"] = time.time()
+
+            def reportProgress(stage: str) -> None:
+                job["stage"] = stage
+
+            try:
+                await self.elevenlabs_service.generateAudio(
+                    job["exercise_id"], text, on_progress=reportProgress)
+                job["status"] = "completed"
+            except HTTPException as e:
+                logger.error(f"Audio job {job_id} failed: {e.detail}")
+                job["status"] = "failed"
+                job["error"] = e.detail
+            except Exception as e:
+                logger.error(f"Audio job {job_id} failed: {str(e)}")
+                job["status"] = "failed"
+                job["error"] = str(e)
+            finally:
+                job["finished_at"] = time.time()
+                self._in_flight -= 1
+                self._queue.task_done()
+
+    async def join(self) -> None:
+        """Wait until every queued job has finished"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        """Stop the workers, abandoning queued jobs"""
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+audio_job_service = AudioJobService()
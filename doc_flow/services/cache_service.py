@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import json
+import logging
+from typing import BinaryIO, Dict, List, Optional, Union
+from core.cache import LRUCache
+from core.config import settings
+from core.metrics import CACHE_LOOKUPS
+from core.timestamp_codec import CONTENT_TYPE as TIMESTAMPS_CONTENT_TYPE, decodeTimestamps, encodeTimestamps
+from core.timestamps import WordTimestamps
+from services.s3_service import s3_service
+
+logger = logging.getLogger(__name__)
+
+# Bump when the extraction pipeline changes in a way that invalidates
+# previously cached results (filtering rules, prompts, models). The
+# extraction settings are part of the key as well, see _extractionKey.
+# v2: local parsers, per-page text blocks and batched OCR
+EXTRACTION_CACHE_VERSION = "v2"
+# v3: timestamps are stored as float64 (timestamp_codec format version 2)
+AUDIO_CACHE_VERSION = "v3"
+
+
+class CacheService:
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CacheService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.s3_service = s3_service
+            self.extractions = LRUCache(
+                max_items=settings.EXTRACTION_CACHE_MAX_ITEMS,
+                max_bytes=settings.EXTRACTION_CACHE_MAX_BYTES,
+                sizeof=self._extractionSize
+            )
+            self._initialized = True
+
+    @staticmethod
+    def _extractionSize(entry: Dict) -> int:
+        return len(entry["text"]) + sum(len(topic) for topic in entry["topics"])
+
+    @staticmethod
+    async def hashContent(file_content: Union[bytes, BinaryIO]) -> str:
+        """
+        Compute the SHA-256 hex digest of a document.
+
+        Streams are hashed in chunks and rewound afterwards so they can still
+        be parsed.
+        """
+        if isinstance(file_content, bytes):
+            return await asyncio.to_thread(lambda: hashlib.sha256(file_content).hexdigest())
+
+        def hashStream(stream: BinaryIO) -> str:
+            digest = hashlib.sha256()
+            stream.seek(0)
+            for chunk in iter(lambda: stream.read(settings.S3_STREAM_CHUNK_SIZE), b''):
+                digest.update(chunk)
+            stream.seek(0)
+            return digest.hexdigest()
+
+        return await asyncio.to_thread(hashStream, file_content)
+
+    def _extractionKey(self, content_hash: str) -> str:
+        # The same document gives different text with another backend or with images scanned
+        variant = f"{settings.EXTRACTION_BACKEND}-{'ocr' if settings.EXTRACTION_SCAN_IMAGES else 'text'}"
+        return f"{settings.EXTRACTION_CACHE_PREFIX}{EXTRACTION_CACHE_VERSION}/{variant}/{content_hash}.json"
+
+    async def getExtraction(self, content_hash: str) -> Optional[Dict]:
+        """
+        Look up a cached extraction result by document hash.
+
+        Returns:
+            Dict with "text", "topics" and optionally "manifest" keys, or None on a miss
+        """
+        if not settings.EXTRACTION_CACHE_ENABLED:
+            return None
+
+        key = self._extractionKey(content_hash)
+        entry = self.extractions.get(key)
+        if entry is not None:
+            CACHE_LOOKUPS.inc(cache="extraction", result="memory_hit")
+            return entry
+
+        try:
+            payload = await self.s3_service.getFile(key)
+            if payload is None:
+                CACHE_LOOKUPS.inc(cache="extraction", result="miss")
+                return None
+            entry = json.loads(payload)
+            self.extractions.set(key, entry)
+            CACHE_LOOKUPS.inc(cache="extraction", result="s3_hit")
+            return entry
+        except Exception as e:
+            # A broken cache entry must never fail the request
+            logger.error(f"Failed to read extraction cache entry: {str(e)}")
+            return None
+
+    async def setExtraction(self, content_hash: str, text: str, topics: List[str],
+                            manifest: Optional[Dict] = None) -> None:
+        """Store an extraction result and its page manifest in the local and persistent cache tiers"""
+        if not settings.EXTRACTION_CACHE_ENABLED:
+            return
+
+        key = self._extractionKey(content_hash)
+        entry = {"text": text, "topics": topics}
+        if manifest is not None:
+            entry["manifest"] = manifest
+        self.extractions.set(key, entry)
+        try:
+            await self.s3_service.uploadFile(
+                key=key,
+                content=json.dumps(entry).encode('utf-8'),
+                content_type='application/json'
+            )
+        except Exception as e:
+            logger.error(f"Failed to write extraction cache entry: {str(e)}")
+
+    @staticmethod
+    def audioKey(text: str, voice_id: str, model_id: str, output_format: str) -> str:
+        """Hash the inputs that determine a synthesis result"""
+        normalized_text = " ".join(text.split())
+        payload = json.dumps([normalized_text, voice_id, model_id, output_format])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _audioPrefix(self, audio_key: str) -> str:
+        return f"{settings.AUDIO_CACHE_PREFIX}{AUDIO_CACHE_VERSION}/{audio_key}"
+
+    async def restoreAudio(self, audio_key: str, dest_key: str) -> Optional[WordTimestamps]:
+        """
+        Copy cached audio to dest_key server-side.
+
+        Returns:
+            The cached word timestamps, or None on a miss
+        """
+        if not settings.AUDIO_CACHE_ENABLED:
+            return None
+
+        try:
+            payload = await self.s3_service.getFile(f"{self._audioPrefix(audio_key)}.timestamps.bin")
+            if payload is None:
+                CACHE_LOOKUPS.inc(cache="audio", result="miss")
+                return None
+            timestamps = await asyncio.to_thread(decodeTimestamps, payload)
+        except Exception as e:
+            logger.error(f"Failed to read audio cache entry: {str(e)}")
+            return None
+
+        if not await self.s3_service.copyFile(f"{self._audioPrefix(audio_key)}.mp3", dest_key):
+            CACHE_LOOKUPS.inc(cache="audio", result="miss")
+            return None
+        CACHE_LOOKUPS.inc(cache="audio", result="hit")
+        return timestamps
+
+    async def storeAudio(self, audio_key: str, source_key: str,
+                         timestamps: Union[List[Dict], WordTimestamps]) -> None:
+        """
+        Cache the audio uploaded at source_key together with its timestamps.
+
+        The timestamps are written last, so an entry is only visible once its
+        audio is in place.
+        """
+        if not settings.AUDIO_CACHE_ENABLED:
+            return
+
+        try:
+            if not await self.s3_service.copyFile(source_key, f"{self._audioPrefix(audio_key)}.mp3"):
+                return
+            await self.s3_service.uploadFile(
+                key=f"{self._audioPrefix(audio_key)}.timestamps.bin",
+                content=await asyncio.to_thread(encodeTimestamps, timestamps),
+                content_type=TIMESTAMPS_CONTENT_TYPE
+            )
+        except Exception as e:
+            logger.error(f"Failed to write audio cache entry: {str(e)}")
+
+cache_service = CacheService()
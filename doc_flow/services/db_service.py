@@ -1,12 +1,18 @@
+import asyncio
 import logging
-from typing import Generator, Callable, TypeVar, List, Dict
+from typing import AsyncGenerator, Awaitable, Generator, Callable, Iterable, Set, Tuple, TypeVar, List, Dict, Optional, Union
 from fastapi import HTTPException
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError, OperationalError
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from core.cache import TTLCache
 from core.config import settings
+from core.metrics import DB_POOL_CONNECTIONS, DB_POOL_WAIT, registry, timeStage
+from core.timestamps import WordTimestamps
 import json
 
 logger = logging.getLogger(__name__)
@@ -14,6 +20,49 @@ logger = logging.getLogger(__name__)
 T = TypeVar('T')
 
 
+EXERCISE_EXISTS_QUERY = 'SELECT EXISTS (SELECT 1 FROM "public"."Exercise" WHERE id = :exercise_id)'
+EXERCISE_OWNER_QUERY = 'SELECT user_id FROM "public"."Exercise" WHERE id = :exercise_id'
+EXISTING_EXERCISES_QUERY = 'SELECT id FROM "public"."Exercise" WHERE id = ANY(:exercise_ids)'
+UPDATE_AUDIO_TIMESTAMPS_QUERY = 'UPDATE "public"."Exercise" SET audio_timestamps = :audio_timestamps WHERE id = :exercise_id'
+SELECT_AUDIO_TIMESTAMPS_QUERY = 'SELECT audio_timestamps FROM "public"."Exercise" WHERE id = :exercise_id'
+# {rows} is filled with one "(id, audio_timestamps)" row of bind parameters per exercise
+BATCH_UPDATE_AUDIO_TIMESTAMPS_QUERY = (
+    'UPDATE "public"."Exercise" AS e SET audio_timestamps = v.audio_timestamps '
+    'FROM (VALUES {rows}) AS v (id, audio_timestamps) WHERE e.id = v.id'
+)
+
+
+def toAsyncUrl(database_url: str) -> URL:
+    """
+    Convert a postgres:// or postgresql:// URL to the asyncpg driver.
+
+    asyncpg takes "ssl" instead of libpq's "sslmode" query parameter.
+    """
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    if "sslmode" in url.query:
+        query = dict(url.query)
+        query["ssl"] = query.pop("sslmode")
+        url = url.set(query=query)
+    return url
+
+
+class _TimedCheckout:
+    """Pool mixin recording how long each checkout takes, including waiting for a free connection"""
+    engine_label = ""
+
+    def _do_get(self):
+        with DB_POOL_WAIT.time(engine=self.engine_label):
+            return super()._do_get()
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    engine_label = "sync"
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+
 class DatabaseService:
     _instance = None
     _initialized = False
@@ -28,11 +77,11 @@ class DatabaseService:
             try:
                 self.engine = create_engine(
                     settings.DATABASE_URL,
-                    poolclass=QueuePool,
-                    pool_size=5,
-                    max_overflow=10,
-                    pool_timeout=30,
-                    pool_recycle=1800,  # Recycle connections after 30 minutes
+                    poolclass=TimedQueuePool,
+                    pool_size=settings.DB_POOL_SIZE,
+                    max_overflow=settings.DB_MAX_OVERFLOW,
+                    pool_timeout=settings.DB_POOL_TIMEOUT,
+                    pool_recycle=settings.DB_POOL_RECYCLE,  # Recycle connections after 30 minutes
                     pool_pre_ping=True,  # Enable connection health checks
                     echo=False  # Set to True for SQL query logging
                 )
@@ -41,6 +90,37 @@ class DatabaseService:
                     autoflush=False,
                     bind=self.engine
                 )
+                # Async engine for request handlers, so queries don't block the event loop
+                self.async_engine = create_async_engine(
+                    toAsyncUrl(settings.DATABASE_URL),
+                    poolclass=TimedAsyncAdaptedQueuePool,
+                    pool_size=settings.DB_POOL_SIZE,
+                    max_overflow=settings.DB_MAX_OVERFLOW,
+                    pool_timeout=settings.DB_POOL_TIMEOUT,
+                    pool_recycle=settings.DB_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                    echo=False
+                )
+                self.async_session_local = async_sessionmaker(
+                    autoflush=False,
+                    expire_on_commit=False,
+                    bind=self.async_engine
+                )
+                # Exercises are never recreated under the same ID, so only
+                # positive lookups are cached. Deletions by the Wasp app are
+                # not seen here: a deleted exercise stays cached until its
+                # entry expires (see EXERCISE_EXISTS_CACHE_TTL)
+                self.known_exercises = TTLCache(
+                    max_items=settings.EXERCISE_EXISTS_CACHE_MAX_ITEMS,
+                    ttl=settings.EXERCISE_EXISTS_CACHE_TTL
+                )
+                # Write buffer for audio timestamps, bound to the loop that uses it
+                self._write_loop: Optional[asyncio.AbstractEventLoop] = None
+                self._pending_timestamps: Dict[str, Tuple[List[str], asyncio.Future]] = {}
+                self._flush_timer: Optional[asyncio.TimerHandle] = None
+                self._flush_lock: Optional[asyncio.Lock] = None
+                self._flush_tasks: Set[asyncio.Task] = set()
+                registry.addCollector(self._collectPoolMetrics)
                 self._initialized = True
             except Exception as e:
                 logger.error(
@@ -48,6 +128,13 @@ class DatabaseService:
                 raise HTTPException(
                     status_code=500, detail=f"Database initialization failed: {str(e)}")
 
+    def _collectPoolMetrics(self) -> None:
+        """Refresh the pool connection gauges before /api/metrics is rendered"""
+        for label, pool in (("sync", self.engine.pool), ("async", self.async_engine.pool)):
+            DB_POOL_CONNECTIONS.set(pool.checkedout(), engine=label, state="checked_out")
+            DB_POOL_CONNECTIONS.set(pool.checkedin(), engine=label, state="idle")
+            DB_POOL_CONNECTIONS.set(max(pool.overflow(), 0), engine=label, state="overflow")
+
     @contextmanager
     def getDb(self) -> Generator[Session, None, None]:
         """Provide a transactional scope around a series of operations."""
@@ -63,6 +150,21 @@ class DatabaseService:
         finally:
             db_session.close()
 
+    @asynccontextmanager
+    async def getAsyncDb(self) -> AsyncGenerator[AsyncSession, None]:
+        """Async version of getDb."""
+        db_session = self.async_session_local()
+        try:
+            yield db_session
+            await db_session.commit()
+        except Exception as e:
+            await db_session.rollback()
+            logger.error(f"Database transaction error: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Database transaction failed: {str(e)}")
+        finally:
+            await db_session.close()
+
     def checkHealth(self) -> bool:
         """Check if database connection is healthy"""
         try:
@@ -73,12 +175,41 @@ class DatabaseService:
             logger.error(f"Database health check failed: {str(e)}")
             return False
 
+    async def checkHealthAsync(self) -> bool:
+        """Async version of checkHealth"""
+        try:
+            async with self.async_engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            logger.error(f"Database health check failed: {str(e)}")
+            return False
+
     def executeQuery(self, query, params=None):
         """Execute a raw SQL query with error handling"""
         try:
             with self.getDb() as db_session:
                 result = db_session.execute(text(query), params or {})
-                return result
+            self.known_exercises.clear()
+            return result
+        except Exception as e:
+            logger.error(f"Query execution failed: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Query execution failed: {str(e)}")
+
+    async def executeQueryAsync(self, query, params=None):
+        """
+        Async version of executeQuery.
+
+        The rows are fetched before the session closes, so the returned
+        result can be read afterwards.
+        """
+        try:
+            async with self.getAsyncDb() as db_session:
+                result = await db_session.execute(text(query), params or {})
+                result = result.freeze()() if result.returns_rows else result
+            self.known_exercises.clear()
+            return result
         except Exception as e:
             logger.error(f"Query execution failed: {str(e)}")
             raise HTTPException(
@@ -93,31 +224,233 @@ class DatabaseService:
             raise HTTPException(
                 status_code=500, detail=f"Failed to close database connections: {str(e)}")
 
+    async def closeConnectionsAsync(self):
+        """Close all async database connections"""
+        try:
+            await self.async_engine.dispose()
+        except Exception as e:
+            logger.error(f"Failed to close database connections: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Failed to close database connections: {str(e)}")
+
     def exercise_exists(self, exercise_id: str) -> bool:
         """Check if an exercise exists in the database"""
         try:
-            with self.getDb() as db_session:
-                result = db_session.execute(text(
-                    'SELECT COUNT(*) FROM "public"."Exercise" WHERE id = :exercise_id'), {"exercise_id": exercise_id})
-                return result.scalar() > 0
+            # A plain connection: a read needs no session or commit
+            with self.engine.connect() as connection:
+                exists = connection.execute(text(EXERCISE_EXISTS_QUERY), {"exercise_id": exercise_id}).scalar()
         except Exception as e:
             logger.error(f"Error checking if exercise exists: {str(e)}")
             raise HTTPException(
                 status_code=500, detail=f"Error checking if exercise exists: {str(e)}")
+        return bool(exists)
+
+    async def exerciseExistsAsync(self, exercise_id: str) -> bool:
+        """
+        Async version of exercise_exists.
+
+        Exercises found are cached for EXERCISE_EXISTS_CACHE_TTL seconds, so
+        one deleted in the meantime may still be reported as existing.
+        """
+        if self.known_exercises.get(exercise_id):
+            return True
+        try:
+            async with self.async_engine.connect() as connection:
+                result = await connection.execute(text(EXERCISE_EXISTS_QUERY), {"exercise_id": exercise_id})
+                exists = result.scalar()
+        except Exception as e:
+            logger.error(f"Error checking if exercise exists: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Error checking if exercise exists: {str(e)}")
+        if exists:
+            self.known_exercises.set(exercise_id, True)
+        return bool(exists)
+
+    async def existingExercisesAsync(self, exercise_ids: Iterable[str]) -> Set[str]:
+        """
+        Check many exercise IDs in one round-trip.
+
+        Returns:
+            The subset of exercise_ids that exist
+        """
+        exercise_ids = set(exercise_ids)
+        existing = {exercise_id for exercise_id in exercise_ids if self.known_exercises.get(exercise_id)}
+        unknown = list(exercise_ids - existing)
+        if not unknown:
+            return existing
+        try:
+            async with self.async_engine.connect() as connection:
+                result = await connection.execute(text(EXISTING_EXERCISES_QUERY), {"exercise_ids": unknown})
+                found = set(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Error checking if exercises exist: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Error checking if exercises exist: {str(e)}")
+        for exercise_id in found:
+            self.known_exercises.set(exercise_id, True)
+        return existing | found
+
+    async def exerciseOwnerAsync(self, exercise_id: str) -> Optional[str]:
+        """
+        Look up the user an exercise belongs to.
+
+        Returns:
+            The owner's user ID, or None if the exercise doesn't exist or has no owner
+        """
+        try:
+            async with self.async_engine.connect() as connection:
+                result = await connection.execute(text(EXERCISE_OWNER_QUERY), {"exercise_id": exercise_id})
+                return result.scalar()
+        except Exception as e:
+            logger.error(f"Error getting exercise owner: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Error getting exercise owner: {str(e)}")
 
-    def updateExerciseAudioTimestamps(self, exercise_id: str, timestamps: List[Dict]):
+    @staticmethod
+    def _serializeTimestamps(timestamps: Union[List[Dict], WordTimestamps]) -> List[str]:
+        """Encode timestamps as the String[] of per-word JSON objects stored in the database"""
+        if isinstance(timestamps, WordTimestamps):
+            # Serialized straight from the arrays, without a dict per word
+            return timestamps.toJsonStrings()
+        return [str(json.dumps(word_object))
+                    for word_object in timestamps]
+
+    def updateExerciseAudioTimestamps(self, exercise_id: str, timestamps: Union[List[Dict], WordTimestamps]):
         """Update the audio timestamps for an exercise"""
-        audio_timestamps = [str(json.dumps(word_object))
-                                for word_object in timestamps]
+        audio_timestamps = self._serializeTimestamps(timestamps)
         try:
             with self.getDb() as db_session:
-                db_session.execute(text(
-                    'UPDATE "public"."Exercise" SET audio_timestamps = :audio_timestamps WHERE id = :exercise_id'), {"exercise_id": exercise_id, "audio_timestamps": audio_timestamps})
+                db_session.execute(text(UPDATE_AUDIO_TIMESTAMPS_QUERY),
+                                   {"exercise_id": exercise_id, "audio_timestamps": audio_timestamps})
+        except Exception as e:
+            logger.error(f"Error updating exercise audio timestamps: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Error updating exercise audio timestamps: {str(e)}")
+
+    async def updateExerciseAudioTimestampsAsync(self, exercise_id: str,
+                                                 timestamps: Union[List[Dict], WordTimestamps]):
+        """
+        Async version of updateExerciseAudioTimestamps.
+
+        The update is buffered and written in one statement together with the
+        other pending updates, DB_WRITE_BUFFER_DELAY seconds after the first of
+        them or as soon as DB_WRITE_BUFFER_MAX_ITEMS are pending. A newer update
+        for the same exercise replaces a pending one. Returns once the update
+        is committed, and raises if the write fails.
+        """
+        audio_timestamps = self._serializeTimestamps(timestamps)
+        if settings.DB_WRITE_BUFFER_DELAY <= 0:
+            await self._writeAudioTimestampsAsync({exercise_id: audio_timestamps})
+            return
+
+        loop = self._ensureWriteBuffer()
+        pending = self._pending_timestamps.get(exercise_id)
+        future = pending[1] if pending is not None else loop.create_future()
+        self._pending_timestamps[exercise_id] = (audio_timestamps, future)
+        if len(self._pending_timestamps) >= settings.DB_WRITE_BUFFER_MAX_ITEMS:
+            self._startFlush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(settings.DB_WRITE_BUFFER_DELAY, self._startFlush)
+        # Shielded, so a cancelled caller doesn't cancel the write for the others
+        await asyncio.shield(future)
+
+    def _ensureWriteBuffer(self) -> asyncio.AbstractEventLoop:
+        """Bind the write buffer to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._write_loop is not loop:
+            self._write_loop = loop
+            self._pending_timestamps = {}
+            self._flush_timer = None
+            self._flush_lock = asyncio.Lock()
+            self._flush_tasks = set()
+        return loop
+
+    def _startFlush(self) -> None:
+        """Hand the pending updates to a background flush"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending_timestamps:
+            return
+        batch, self._pending_timestamps = self._pending_timestamps, {}
+        task = self._write_loop.create_task(self._flushTimestamps(batch))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flushTimestamps(self, batch: Dict[str, Tuple[List[str], asyncio.Future]]) -> None:
+        # Flushes run one at a time, so an older batch never overwrites a newer one
+        async with self._flush_lock:
+            try:
+                await self._writeAudioTimestampsAsync(
+                    {exercise_id: audio_timestamps for exercise_id, (audio_timestamps, _) in batch.items()})
+            except Exception as e:
+                for _, future in batch.values():
+                    if not future.done():
+                        future.set_exception(e)
+                return
+        for _, future in batch.values():
+            if not future.done():
+                future.set_result(None)
+
+    async def _writeAudioTimestampsAsync(self, updates: Dict[str, List[str]]) -> None:
+        """Write the audio timestamps of several exercises in a single UPDATE"""
+        rows = []
+        params = {}
+        for i, (exercise_id, audio_timestamps) in enumerate(updates.items()):
+            # VALUES rows carry no column types, so the parameters are cast explicitly
+            rows.append(f"(CAST(:exercise_id_{i} AS text), CAST(:audio_timestamps_{i} AS text[]))")
+            params[f"exercise_id_{i}"] = exercise_id
+            params[f"audio_timestamps_{i}"] = audio_timestamps
+        query = BATCH_UPDATE_AUDIO_TIMESTAMPS_QUERY.format(rows=", ".join(rows))
+        try:
+            with timeStage("db", "write_timestamps"):
+                async with self.getAsyncDb() as db_session:
+                    await db_session.execute(text(query), params)
         except Exception as e:
             logger.error(f"Error updating exercise audio timestamps: {str(e)}")
             raise HTTPException(
                 status_code=500, detail=f"Error updating exercise audio timestamps: {str(e)}")
 
+    async def flushAsync(self) -> None:
+        """Write any buffered updates now and wait until they are committed"""
+        if self._write_loop is not asyncio.get_running_loop():
+            return
+        self._startFlush()
+        await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+
+    async def getExerciseAudioTimestampsAsync(self, exercise_id: str) -> Optional[List[Dict]]:
+        """Get the audio timestamps of an exercise, or None if it has none"""
+        try:
+            async with self.getAsyncDb() as db_session:
+                result = await db_session.execute(text(SELECT_AUDIO_TIMESTAMPS_QUERY), {"exercise_id": exercise_id})
+                audio_timestamps = result.scalar()
+        except Exception as e:
+            logger.error(f"Error getting exercise audio timestamps: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Error getting exercise audio timestamps: {str(e)}")
+        if not audio_timestamps:
+            return None
+        return [json.loads(word_object) for word_object in audio_timestamps]
+
+    @staticmethod
+    def _transactionError(e: Exception) -> HTTPException:
+        """Translate an error raised by a transaction into an HTTPException"""
+        if isinstance(e, IntegrityError):
+            logger.error(f"Database integrity error: {str(e)}")
+            return HTTPException(
+                status_code=500, detail=f"Database integrity constraint violated: {str(e)}")
+        if isinstance(e, OperationalError):
+            logger.error(f"Database operational error: {str(e)}")
+            return HTTPException(
+                status_code=500, detail=f"Database connection or operational error: {str(e)}")
+        if isinstance(e, SQLAlchemyError):
+            logger.error(f"SQLAlchemy error: {str(e)}")
+            return HTTPException(
+                status_code=500, detail=f"Database query error: {str(e)}")
+        logger.error(f"Unexpected database error: {str(e)}")
+        return HTTPException(
+            status_code=500, detail=f"Unexpected database error: {str(e)}")
+
     def executeTransaction(self, operation: Callable[[Session], T]) -> T:
         """
         Execute a database operation within a transaction with specific error handling.
@@ -134,22 +467,32 @@ class DatabaseService:
         try:
             with self.getDb() as db_session:
                 return operation(db_session)
-        except IntegrityError as e:
-            logger.error(f"Database integrity error: {str(e)}")
-            raise HTTPException(
-                status_code=500, detail=f"Database integrity constraint violated: {str(e)}")
-        except OperationalError as e:
-            logger.error(f"Database operational error: {str(e)}")
-            raise HTTPException(
-                status_code=500, detail=f"Database connection or operational error: {str(e)}")
-        except SQLAlchemyError as e:
-            logger.error(f"SQLAlchemy error: {str(e)}")
-            raise HTTPException(
-                status_code=500, detail=f"Database query error: {str(e)}")
         except Exception as e:
-            logger.error(f"Unexpected database error: {str(e)}")
-            raise HTTPException(
-                status_code=500, detail=f"Unexpected database error: {str(e)}")
+            raise self._transactionError(e)
+        finally:
+            # The operation may have deleted exercises
+            self.known_exercises.clear()
+
+    async def executeTransactionAsync(self, operation: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """
+        Async version of executeTransaction.
 
+        Args:
+            operation: An async callable that takes an AsyncSession and returns a result
+
+        Returns:
+            The result of the operation
+
+        Raises:
+            Exception: If there's an error in the query
+        """
+        try:
+            async with self.getAsyncDb() as db_session:
+                return await operation(db_session)
+        except Exception as e:
+            raise self._transactionError(e)
+        finally:
+            # The operation may have deleted exercises
+            self.known_exercises.clear()
 
 db_service = DatabaseService()
@@ -1,16 +1,42 @@
+import asyncio
+import json
 import logging
-from typing import Dict, List, Optional
-from services.openai_service import openai_service
+from typing import AbstractSet, AsyncIterator, BinaryIO, Dict, List, NamedTuple, Optional, Union
+from services.openai_service import openai_service, TopicStream
 from services.s3_service import s3_service
+from services.cache_service import cache_service
 from core.config import settings
+from core.metrics import timeStage
+from core.pages import ExtractedPage, ManifestChunk, PageManifest, manifestKey
+from core.stages import StageGraph
+from core.url_filter import url_filter
 from fastapi import HTTPException
 from tika import parser
 from io import BytesIO
-import re
+
+try:
+    from services.file_processors import FileProcessor
+    from services.extraction_pool import extraction_pool, spoolToPath
+except ImportError:  # PyMuPDF, python-pptx or openpyxl not installed
+    FileProcessor = None
+    extraction_pool = None
+    spoolToPath = None
 
 logger = logging.getLogger(__name__)
 
 
+class CleanDocument(NamedTuple):
+    text: str
+    # None when the text isn't split into fingerprinted pages
+    manifest: Optional[PageManifest]
+
+
+class PreviousVersion(NamedTuple):
+    manifest: PageManifest
+    # Cleaned text of each page, by fingerprint
+    page_texts: Dict[str, str]
+
+
 class DocumentService:
     _instance: Optional['DocumentService'] = None
     _initialized: bool = False
@@ -24,6 +50,7 @@ class DocumentService:
         if not self._initialized:
             self.openai_service = openai_service
             self.s3_service = s3_service
+            self.cache_service = cache_service
             self._initialized = True
 
     def _filter_urls(self, text: str) -> str:
@@ -47,41 +74,35 @@ class DocumentService:
             return ""
 
         try:
-            # Remove standard URLs
-            text = re.sub(
-                r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', '', text)
-
-            # Remove URLs with common TLDs
-            text = re.sub(
-                r'(?:www\.)?[a-zA-Z0-9-]+\.[a-zA-Z]{2,}(?:\.[a-zA-Z]{2,})?(?:/\S*)?', '', text)
-
-            # Remove YouTube URLs
-            text = re.sub(
-                r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=[\w-]+', '', text)
-
-            # Remove arXiv URLs
-            text = re.sub(r'arxiv:\d{4}\.\d{4,5}', '', text)
-
-            # Remove source attributions
-            text = re.sub(r'source:\s*[^\n]+', '', text)
-
-            # Clean up extra whitespace
-            text = re.sub(r'\s+', ' ', text)
-            text = text.strip()
-
-            return text
+            with timeStage("doc", "filter_urls"):
+                return url_filter.filter(text)
         except Exception as e:
             logger.error(f"Error filtering URLs: {str(e)}")
             return text  # Return original text if filtering fails
 
-    async def processFile(self, file_id: str, file_content: bytes) -> Dict[str, List[str]]:
+    async def processFile(self, file_id: str, file_content: Union[bytes, BinaryIO],
+                          file_type: Optional[str] = None,
+                          timings: Optional[Dict[str, float]] = None,
+                          previous_file_id: Optional[str] = None) -> Dict[str, List[str]]:
         """
         Process a file based on its extension asynchronously.
 
+        After the cache lookup, the work runs as a StageGraph: once the text
+        is extracted, the S3 upload of the text and the end of topic
+        extraction run concurrently, so the response waits for the slower of
+        the two rather than both.
+
+        Page fingerprints are stored as {file_id}.pages.json. Given the ID of
+        a previous version of the document, only its changed pages are
+        extracted and sent for topic extraction again (see _extractCleanText).
+
         Args:
             file_id: ID of the file to process
-            file_content: Content of the file to process
-            file_type: Type/extension of the file
+            file_content: Content of the file to process, either as bytes or as a
+                readable binary stream (e.g. from S3Service.spoolFile)
+            file_type: Type/extension of the file, used to pick the extraction backend
+            timings: Optional dict that receives the duration of each stage in seconds
+            previous_file_id: Optional ID of an earlier version of the same document
 
         Returns:
             Dict containing extracted topics
@@ -93,19 +114,255 @@ class DocumentService:
         if not file_id or not isinstance(file_id, str):
             raise HTTPException(status_code=400, detail="Invalid file ID")
 
-        if not file_content or not isinstance(file_content, bytes):
+        if isinstance(file_content, bytes):
+            if not file_content:
+                raise HTTPException(
+                    status_code=400, detail="Invalid file content")
+            file_obj = BytesIO(file_content)
+        elif hasattr(file_content, 'read'):
+            file_obj = file_content
+        else:
             raise HTTPException(
                 status_code=400, detail="Invalid file content")
 
-        file_obj = BytesIO(file_content)
-        file_obj.name = file_id
+        # Serve repeat uploads of the same document from the extraction cache
+        with timeStage("doc", "hash", timings):
+            content_hash = await self.cache_service.hashContent(file_obj)
+        with timeStage("doc", "cache", timings):
+            cached = await self.cache_service.getExtraction(content_hash)
+        if cached is not None:
+            logger.info(f"Extraction cache hit for {file_id} ({content_hash})")
+            with timeStage("doc", "upload", timings):
+                if cached.get("manifest"):
+                    await asyncio.gather(self._storeText(file_id, cached["text"]),
+                                         self._uploadManifest(file_id, cached["manifest"]))
+                else:
+                    await self._storeText(file_id, cached["text"])
+            return cached["topics"]
+
+        previous = None
+        if previous_file_id and settings.PAGE_MANIFEST_ENABLED:
+            with timeStage("doc", "previous", timings):
+                previous = await self._loadPreviousVersion(previous_file_id, file_type)
+
+        # Topic extraction starts on the first chunks while later sections
+        # (e.g. PDF pages) are still being extracted and filtered
+        topic_stream = TopicStream(self.openai_service)
+        stages = StageGraph(service="doc")
+        stages.add("extract", lambda: self._extractCleanText(file_id, file_obj, file_type, topic_stream, previous))
+        stages.add("topics", lambda document: topic_stream.finish(), after=["extract"])
+        stages.add("upload", lambda document: self._storeText(file_id, document.text), after=["extract"])
+        stages.add("manifest",
+                   lambda document, extracted_topics: self._storeManifest(file_id, document.manifest, topic_stream),
+                   after=["extract", "topics"])
+        # A cache hit uploads the text itself, so storing the entry needn't wait for the upload
+        stages.add("cache_store",
+                   lambda document, extracted_topics, manifest: self.cache_service.setExtraction(
+                       content_hash, document.text, extracted_topics, manifest),
+                   after=["extract", "topics", "manifest"])
+        try:
+            results = await stages.run()
+        except BaseException:
+            topic_stream.cancel()
+            raise
+        finally:
+            self._recordTimings(timings, stages)
+
+        return results["topics"]
+
+    async def _extractCleanText(self, file_id: str, file_obj: BinaryIO, file_type: Optional[str],
+                                topic_stream: TopicStream,
+                                previous: Optional[PreviousVersion] = None) -> CleanDocument:
+        """
+        Extract and filter the text page by page, feeding each page to topic_stream.
+
+        With a previous version of the document, pages whose fingerprint is
+        unchanged are not extracted again but take their cleaned text from
+        it, and the topics of its chunks whose pages are all unchanged are
+        reused. Only the remaining pages are sent for topic extraction, once
+        every page is known. Reused chunks and new pages are fed in document
+        order, a reused chunk where its first page is, so the topics come out
+        in the same order as for a full run.
+        """
+        page_texts = previous.page_texts if previous else {}
+        cleaned_pages = []
+        async for page in self._iterText(file_id, file_obj, file_type, frozenset(page_texts)):
+            cleaned_page = page_texts[page.fingerprint] if page.text is None else self._filter_urls(page.text)
+            if cleaned_page:
+                cleaned_pages.append((page.fingerprint, cleaned_page))
+                if previous is None:
+                    topic_stream.add(cleaned_page, page.fingerprint)
+
+        if not cleaned_pages:
+            raise HTTPException(
+                status_code=422, detail="No valid text content after filtering")
 
+        if previous is not None:
+            reused, covered = previous.manifest.reusableChunks({fingerprint for fingerprint, _ in cleaned_pages})
+            chunks_by_first_page: Dict[str, List[ManifestChunk]] = {}
+            for chunk in reused:
+                chunks_by_first_page.setdefault(chunk.pages[0], []).append(chunk)
+            for fingerprint, cleaned_page in cleaned_pages:
+                for chunk in chunks_by_first_page.pop(fingerprint, []):
+                    topic_stream.reuse(chunk.topics, chunk.pages)
+                if fingerprint not in covered:
+                    topic_stream.add(cleaned_page, fingerprint)
+            changed = sum(1 for fingerprint, _ in cleaned_pages if fingerprint not in page_texts)
+            logger.info(
+                f"Reprocessing {file_id}: {changed} of {len(cleaned_pages)} pages changed, "
+                f"{len(reused)} of {len(previous.manifest.chunks)} topic chunks reused")
+
+        manifest = None
+        if all(fingerprint is not None for fingerprint, _ in cleaned_pages):
+            manifest = PageManifest.fromPages(
+                (file_type or "").lower().lstrip("."), settings.EXTRACTION_SCAN_IMAGES, cleaned_pages)
+        return CleanDocument(" ".join(cleaned_page for _, cleaned_page in cleaned_pages), manifest)
+
+    async def _loadPreviousVersion(self, previous_file_id: str, file_type: Optional[str]) -> Optional[PreviousVersion]:
+        """
+        Load the page manifest and cleaned text of a previous version of a
+        document, or None if there is no usable one.
+        """
+        manifest_payload, text_payload = await asyncio.gather(
+            self.s3_service.getFile(manifestKey(previous_file_id)),
+            self.s3_service.getFile(f"{previous_file_id}.txt")
+        )
+        if manifest_payload is None or text_payload is None:
+            logger.info(f"No page manifest for {previous_file_id}, processing the whole document")
+            return None
+
+        try:
+            manifest = PageManifest.fromDict(json.loads(manifest_payload))
+            page_texts = manifest.pageTexts(text_payload.decode('utf-8'))
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.warning(f"Ignoring page manifest of {previous_file_id}: {str(e)}")
+            return None
+        if not manifest.matches((file_type or "").lower().lstrip("."), settings.EXTRACTION_SCAN_IMAGES):
+            logger.info(f"Page manifest of {previous_file_id} was extracted differently, processing the whole document")
+            return None
+        return PreviousVersion(manifest, page_texts)
+
+    async def _storeManifest(self, file_id: str, manifest: Optional[PageManifest],
+                             topic_stream: TopicStream) -> Optional[Dict]:
+        """Record the topics of each chunk in the page manifest and upload it as {file_id}.pages.json"""
+        if manifest is None or not settings.PAGE_MANIFEST_ENABLED:
+            return None
+        manifest.chunks = [ManifestChunk(labels, topics) for labels, topics in topic_stream.chunks]
+        payload = manifest.toDict()
+        await self._uploadManifest(file_id, payload)
+        return payload
+
+    async def _uploadManifest(self, file_id: str, payload: Dict) -> None:
+        try:
+            await self.s3_service.uploadFile(
+                key=manifestKey(file_id),
+                content=json.dumps(payload).encode('utf-8'),
+                content_type='application/json'
+            )
+        except Exception as e:
+            # Without a manifest the next version is simply processed in full
+            logger.error(f"Failed to upload page manifest: {str(e)}")
+
+    @staticmethod
+    def _recordTimings(timings: Optional[Dict[str, float]], stages: StageGraph) -> None:
+        if timings is not None:
+            timings.update(stages.timings)
+
+    async def _iterText(self, file_id: str, file_obj: BinaryIO, file_type: Optional[str],
+                        skip: AbstractSet[str] = frozenset()) -> AsyncIterator[ExtractedPage]:
+        """
+        Extract text with the backend selected by EXTRACTION_BACKEND, page by page.
+
+        In "auto" mode PDF, PPTX and XLSX files are parsed locally by
+        FileProcessor, and Tika is used for other types or when local
+        extraction fails or yields nothing. "local" never falls back to Tika
+        and "tika" always uses it.
+
+        Local extraction yields each page, slide or sheet with its
+        fingerprint, without text if the fingerprint is in skip. PDFs parsed
+        in the extraction pool are yielded as their pages are extracted. Tika
+        yields the whole text at once, without a fingerprint.
+        """
+        backend = settings.EXTRACTION_BACKEND
+        file_type = (file_type or "").lower().lstrip(".")
+        if backend != "tika" and FileProcessor is not None and file_type in FileProcessor.SUPPORTED_TYPES:
+            has_text = False
+            try:
+                async for page in self._iterLocalText(file_obj, file_type, skip):
+                    # Skipped pages had text in the previous version
+                    if page.text is not None:
+                        page = page._replace(text=page.text.strip())
+                    if page.text is None or page.text:
+                        has_text = True
+                        yield page
+            except HTTPException as e:
+                # Pages already handed out can't be taken back
+                if backend == "local" or has_text:
+                    raise
+                logger.warning(f"Local extraction failed for {file_id}: {e.detail}")
+            if has_text:
+                return
+            if backend == "local":
+                raise HTTPException(
+                    status_code=422, detail="Extracted text is empty")
+            logger.warning(
+                f"Local extraction returned no text for {file_id}, falling back to Tika")
+        elif backend == "local":
+            raise HTTPException(
+                status_code=400, detail=f"Unsupported file type for local extraction: {file_type}")
+
+        file_obj.seek(0)
+        yield ExtractedPage(None, await self._extractWithTika(file_id, file_obj))
+
+    async def _iterLocalText(self, file_obj: BinaryIO, file_type: str,
+                             skip: AbstractSet[str]) -> AsyncIterator[ExtractedPage]:
+        if file_type == "pdf" and settings.EXTRACTION_POOL_ENABLED:
+            async for page in extraction_pool.iterPdfPages(file_obj, settings.EXTRACTION_SCAN_IMAGES, skip):
+                yield page
+        else:
+            for page in await self._extractLocally(file_obj, file_type, skip):
+                yield page
+
+    async def _extractLocally(self, file_obj: BinaryIO, file_type: str,
+                              skip: AbstractSet[str]) -> List[ExtractedPage]:
+        """
+        Parse a document with FileProcessor, in the extraction process pool when enabled.
+
+        The spooled upload is never read into memory whole: the pool workers
+        and the PDF parser get a temp file copy of it, the PPTX and XLSX
+        parsers read it as a stream. Without the pool, parsing runs in a
+        thread so it doesn't block the event loop.
+        """
+        file_obj.seek(0)
+        with timeStage("doc", "parse"):
+            if settings.EXTRACTION_POOL_ENABLED:
+                return await extraction_pool.extractPages(
+                    file_type, file_obj, settings.EXTRACTION_SCAN_IMAGES, skip)
+            if file_type != "pdf":
+                return await asyncio.to_thread(self._parsePages, file_type, file_obj, skip)
+            async with spoolToPath(file_obj, ".pdf") as pdf_path:
+                return await asyncio.to_thread(self._parsePages, file_type, pdf_path, skip)
+
+    @staticmethod
+    def _parsePages(file_type: str, source: Union[str, BinaryIO], skip: AbstractSet[str]) -> List[ExtractedPage]:
+        # The parsers are CPU-bound; extract_pages is only async to await the OCR batch
+        return asyncio.run(FileProcessor.extract_pages(file_type, source, settings.EXTRACTION_SCAN_IMAGES, skip))
+
+    async def _extractWithTika(self, file_id: str, file_obj: BinaryIO) -> str:
+        """Extract text by sending the file to the Tika server"""
         try:
             if not settings.TIKA_SERVER_ENDPOINT:
                 raise ValueError("Tika server endpoint not configured")
 
-            parsed_content = parser.from_file(
-                file_obj, serverEndpoint=settings.TIKA_SERVER_ENDPOINT)
+            # from_buffer streams the file object to Tika as the request body,
+            # so the document is not copied into memory again.
+            with timeStage("doc", "tika"):
+                parsed_content = await asyncio.to_thread(
+                    parser.from_buffer,
+                    file_obj,
+                    serverEndpoint=settings.TIKA_SERVER_ENDPOINT,
+                    headers={'Content-Disposition': f'attachment; filename={file_id}'}
+                )
             if not parsed_content or 'content' not in parsed_content:
                 raise HTTPException(
                     status_code=422, detail="Failed to extract text from file")
@@ -123,16 +380,10 @@ class DocumentService:
             raise HTTPException(
                 status_code=500, detail="Error extracting text from file")
 
-        # Filter URLs from extracted text
-        cleaned_text = self._filter_urls(extracted_text)
-        if not cleaned_text:
-            raise HTTPException(
-                status_code=422, detail="No valid text content after filtering")
-
-        # Extract topics using OpenAI
-        extracted_topics = await self.openai_service.extractTopics(cleaned_text)
+        return extracted_text
 
-        # Upload extracted text content to S3
+    async def _storeText(self, file_id: str, cleaned_text: str) -> None:
+        """Upload the cleaned text of a document to S3 as {file_id}.txt"""
         text_filename = f"{file_id}.txt"
         upload_success = await self.s3_service.uploadFile(
             key=text_filename,
@@ -147,8 +398,5 @@ class DocumentService:
                 status_code=500, detail="Failed to store processed text")
 
 
-        return extracted_topics
-
-
 # Singleton instance
 doc_service = DocumentService()
@@ -1,10 +1,19 @@
+import asyncio
 import logging
 import os
 import re
 import base64
-from elevenlabs.client import ElevenLabs
+from elevenlabs.client import AsyncElevenLabs
+from elevenlabs.environment import ElevenLabsEnvironment
 from elevenlabs.errors import BadRequestError, ForbiddenError, NotFoundError, TooEarlyError, UnprocessableEntityError
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Union
+from core.audio import Base64StreamDecoder, Mp3DurationCounter, mp3Duration
+from core.chunking import packSentences
+from core.config import settings
+from core.metrics import BYTES_PROCESSED, timeStage
+from core.timestamp_codec import CONTENT_TYPE as TIMESTAMPS_CONTENT_TYPE, encodeTimestamps
+from core.timestamps import WordTimestamps
+from services.cache_service import cache_service
 from services.db_service import db_service
 from services.s3_service import s3_service
 from fastapi import HTTPException
@@ -13,6 +22,15 @@ import json
 
 logger = logging.getLogger(__name__)
 
+VOICE_ID = "XrExE9yKIg1WjnnlVkGX"
+MODEL_ID = "eleven_multilingual_v2"
+OUTPUT_FORMAT = "mp3_44100_64"
+
+
+def timestampsKey(exercise_id: str) -> str:
+    """S3 key of the binary word timestamps stored next to an exercise's MP3"""
+    return f"{exercise_id}.timestamps.bin"
+
 
 class ElevenLabsService:
     _instance = None
@@ -31,7 +49,14 @@ class ElevenLabsService:
                     status_code=500, detail="ELEVENLABS_API_KEY is not configured")
 
             try:
-                self.elevenlabs_client = ElevenLabs(api_key=api_key, timeout=3600)
+                client_args = {}
+                if settings.ELEVENLABS_BASE_URL:
+                    base_url = settings.ELEVENLABS_BASE_URL.rstrip("/")
+                    client_args["environment"] = ElevenLabsEnvironment(
+                        base=base_url, wss=base_url.replace("http", "ws", 1))
+                self.elevenlabs_client = AsyncElevenLabs(
+                    api_key=api_key, timeout=settings.ELEVENLABS_TIMEOUT, **client_args)
+                self._semaphore = asyncio.Semaphore(settings.ELEVENLABS_MAX_CONCURRENT_REQUESTS)
                 self._initialized = True
             except Exception as e:
                 logger.error(
@@ -65,82 +90,200 @@ class ElevenLabsService:
         result = '. '.join(processed_texts)
         return result
 
-    def extractTimestamps(self, response: Dict) -> List[Dict]:
-        chars = response.normalized_alignment.characters
-        starts = response.normalized_alignment.character_start_times_seconds
-        ends = response.normalized_alignment.character_end_times_seconds
-
-        timestamps = []
-        current_word = ""
-        word_start = 0
-
-        for i in range(len(chars)):
-            char = chars[i]
-
-            if char.isspace():
-                if current_word:
-                    timestamps.append({
-                        "word": current_word,
-                        "start": word_start,
-                        "end": ends[i - 1]
-                    })
-                    current_word = ""
-            else:
-                if not current_word:
-                    word_start = starts[i]
-                current_word += char
-
-        if current_word:
-            timestamps.append({
-                "word": current_word,
-                "start": word_start,
-                "end": ends[-1]
-            })
+    def extractTimestamps(self, response: Dict, offset: float = 0.0) -> List[Dict]:
+        """Group the character alignment of a response into words, shifting times by offset seconds"""
+        return self.extractWordTimestamps(response, offset).toDicts()
+
+    def extractWordTimestamps(self, response: Dict, offset: float = 0.0) -> WordTimestamps:
+        """Like extractTimestamps, but returns array-backed WordTimestamps instead of dicts"""
+        alignment = response.normalized_alignment
+        with timeStage("elevenlabs", "extract_timestamps"):
+            return WordTimestamps.fromAlignment(alignment.characters, alignment.character_start_times_seconds,
+                                                alignment.character_end_times_seconds, offset)
+
+    @staticmethod
+    def _requestArgs(chunks: List[str], index: int) -> Dict:
+        """
+        Build the synthesis request for one chunk of text.
+
+        The neighbouring chunks are passed as context so the intonation flows
+        across chunk boundaries.
+        """
+        args = {
+            "voice_id": VOICE_ID,
+            "output_format": OUTPUT_FORMAT,
+            "text": chunks[index],
+            "model_id": MODEL_ID,
+            "request_options": {"max_retries": settings.ELEVENLABS_MAX_RETRIES},
+        }
+        if index > 0:
+            args["previous_text"] = chunks[index - 1]
+        if index + 1 < len(chunks):
+            args["next_text"] = chunks[index + 1]
+        return args
+
+    @staticmethod
+    def _apiError(e: Exception) -> HTTPException:
+        """Translate an ElevenLabs client error into an HTTPException"""
+        if isinstance(e, HTTPException):
+            return e
+        for error_type in (BadRequestError, ForbiddenError, TooEarlyError, UnprocessableEntityError):
+            if isinstance(e, error_type):
+                return HTTPException(
+                    status_code=500,
+                    detail=f"{error_type.__name__}: {str(e)}"
+                )
+        logger.error(f"Unexpected error during API call: {str(e)}")
+        return HTTPException(
+            status_code=500,
+            detail=f"Unexpected error during API call: {str(e)}")
+
+    async def _synthesizeChunk(self, chunks: List[str], index: int):
+        """Synthesize one chunk of text with its character alignment"""
+        async with self._semaphore:
+            try:
+                with timeStage("elevenlabs", "synthesize"):
+                    return await self.elevenlabs_client.text_to_speech.convert_with_timestamps(
+                        **self._requestArgs(chunks, index))
+            except Exception as e:
+                raise self._apiError(e)
+
+    async def _synthesizeParallel(self, chunks: List[str], s3_key: str,
+                                  reportProgress: Callable[[str], None]) -> WordTimestamps:
+        """
+        Synthesize all chunks concurrently, then upload the joined audio.
+
+        Returns:
+            The word timestamps of the whole text
+        """
+        tasks = [asyncio.ensure_future(self._synthesizeChunk(chunks, index)) for index in range(len(chunks))]
+        try:
+            responses = await asyncio.gather(*tasks)
+        except BaseException:
+            # One failed chunk fails the whole job; don't keep paying for the rest
+            for task in tasks:
+                task.cancel()
+            raise
+
+        timestamps = WordTimestamps()
+        audio_segments = []
+        offset = 0.0
+        for response in responses:
+            audio_segment = base64.b64decode(response.audio_base_64)
+            BYTES_PROCESSED.inc(len(audio_segment), service="elevenlabs", direction="in")
+            timestamps.extend(self.extractWordTimestamps(response, offset))
+            offset += mp3Duration(audio_segment)
+            audio_segments.append(audio_segment)
+
+        reportProgress("uploading")
+        await s3_service.uploadFile(s3_key, b"".join(audio_segments), "audio/mpeg")
+        return timestamps
+
+    async def _synthesizeStreaming(self, chunks: List[str], s3_key: str) -> WordTimestamps:
+        """
+        Stream the chunks one after another into a multipart S3 upload.
+
+        Audio is decoded and uploaded as it arrives, so only the current S3
+        part is held in memory regardless of the length of the lesson.
 
+        Returns:
+            The word timestamps of the whole text
+        """
+        timestamps = WordTimestamps()
+        offset = 0.0
+        async with s3_service.openMultipartUpload(s3_key, "audio/mpeg") as upload:
+            for index in range(len(chunks)):
+                decoder = Base64StreamDecoder()
+                duration = Mp3DurationCounter()
+                chars, starts, ends = [], [], []
+                async with self._semaphore:
+                    try:
+                        with timeStage("elevenlabs", "synthesize_stream"):
+                            stream = self.elevenlabs_client.text_to_speech.stream_with_timestamps(
+                                **self._requestArgs(chunks, index))
+                            async for part in stream:
+                                if part.audio_base_64:
+                                    audio = decoder.decode(part.audio_base_64)
+                                    BYTES_PROCESSED.inc(len(audio), service="elevenlabs", direction="in")
+                                    duration.feed(audio)
+                                    await upload.write(audio)
+                                # Times within a stream are relative to the start of its audio
+                                if part.normalized_alignment is not None:
+                                    chars.extend(part.normalized_alignment.characters)
+                                    starts.extend(part.normalized_alignment.character_start_times_seconds)
+                                    ends.extend(part.normalized_alignment.character_end_times_seconds)
+                    except Exception as e:
+                        raise self._apiError(e)
+
+                audio = decoder.finish()
+                BYTES_PROCESSED.inc(len(audio), service="elevenlabs", direction="in")
+                duration.feed(audio)
+                await upload.write(audio)
+                with timeStage("elevenlabs", "extract_timestamps"):
+                    timestamps.extend(WordTimestamps.fromAlignment(chars, starts, ends, offset))
+                offset += duration.duration
         return timestamps
 
-    async def generateAudio(self, exercise_id: str, text: str) -> Dict:
+    async def saveTimestamps(self, exercise_id: str, timestamps: Union[List[Dict], WordTimestamps]) -> None:
+        """Store word timestamps as configured by AUDIO_TIMESTAMPS_STORAGE"""
+        storage = settings.AUDIO_TIMESTAMPS_STORAGE
+        with timeStage("elevenlabs", "save_timestamps"):
+            if storage in ("s3", "both"):
+                blob = await asyncio.to_thread(encodeTimestamps, timestamps)
+                await s3_service.uploadFile(timestampsKey(exercise_id), blob, TIMESTAMPS_CONTENT_TYPE)
+            if storage in ("db", "both"):
+                await db_service.updateExerciseAudioTimestampsAsync(exercise_id, timestamps)
+
+    async def generateAudio(self, exercise_id: str, text: str,
+                            on_progress: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Synthesize the <listen> blocks of the text, store the word timestamps
+        and upload the audio to S3.
+
+        The text is split on sentence boundaries into chunks. In "parallel"
+        mode the chunks are synthesized concurrently and the MP3 segments are
+        concatenated; in "streaming" mode they are synthesized in order and
+        uploaded in parts as the audio arrives. Either way each chunk's word
+        timestamps are shifted by the duration of the audio before it.
+
+        Results are cached by text, voice, model and output format; on a cache
+        hit the audio is copied within S3 and nothing is synthesized.
+
+        on_progress, if given, is called with the name of each stage as it starts.
+        """
+        with timeStage("elevenlabs", "generate_audio"):
+            await self._generateAudio(exercise_id, text, on_progress)
+
+    async def _generateAudio(self, exercise_id: str, text: str,
+                             on_progress: Optional[Callable[[str], None]]) -> None:
+        def reportProgress(stage: str) -> None:
+            if on_progress is not None:
+                on_progress(stage)
+
         filtered_text = self.filterText(text)
-        try:
-            response = self.elevenlabs_client.text_to_speech.convert_with_timestamps(
-                voice_id="XrExE9yKIg1WjnnlVkGX",
-                output_format="mp3_44100_64",
-                text=filtered_text,
-                model_id="eleven_multilingual_v2",
-            )
-        except BadRequestError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"BadRequestError: {str(e)}"
-            )
-        except ForbiddenError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"ForbiddenError: {str(e)}"
-            )
-        except TooEarlyError as e:
+        chunks = packSentences(filtered_text, settings.ELEVENLABS_CHUNK_MAX_CHARS)
+        if not chunks:
             raise HTTPException(
-                status_code=500,
-                detail=f"TooEarlyError: {str(e)}"
-            )
-        except UnprocessableEntityError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"UnprocessableEntityError: {str(e)}"
-            )
-        except Exception as e:
-            logger.error(f"Unexpected error during API call: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Unexpected error during API call: {str(e)}")
-
-        timestamps = self.extractTimestamps(response)
-        db_service.updateExerciseAudioTimestamps(exercise_id, timestamps)
+                status_code=400, detail="No text to synthesize in <listen> tags")
 
         s3_key = f"{exercise_id}.mp3"
-        audio_data = base64.b64decode(response.audio_base_64)
+        audio_key = cache_service.audioKey(filtered_text, VOICE_ID, MODEL_ID, OUTPUT_FORMAT)
+        timestamps = await cache_service.restoreAudio(audio_key, s3_key)
+        if timestamps is not None:
+            logger.info(f"Reusing cached audio for exercise {exercise_id}")
+            reportProgress("saving_timestamps")
+            await self.saveTimestamps(exercise_id, timestamps)
+            return
+
+        reportProgress("synthesizing")
+        if settings.ELEVENLABS_SYNTHESIS_MODE == "streaming":
+            timestamps = await self._synthesizeStreaming(chunks, s3_key)
+        else:
+            timestamps = await self._synthesizeParallel(chunks, s3_key, reportProgress)
 
-        await s3_service.uploadFile(s3_key, audio_data, "audio/mpeg")
+        reportProgress("saving_timestamps")
+        await self.saveTimestamps(exercise_id, timestamps)
+        await cache_service.storeAudio(audio_key, s3_key, timestamps)
 
 
 elevenlabs_service = ElevenLabsService()
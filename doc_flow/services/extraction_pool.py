@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import signal
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AbstractSet, Any, AsyncIterator, BinaryIO, Callable, List, Optional, Tuple
+from core.config import settings
+from core.pages import ExtractedPage
+from fastapi import HTTPException
+from services.file_processors import FileProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionTimeout(BaseException):
+    """
+    Raised inside a worker when an extraction exceeds its time budget.
+
+    Derives from BaseException so the extractors' broad exception handlers
+    don't swallow it and return partial text.
+    """
+
+
+def _warmWorker() -> None:
+    """Worker initializer: preload the parsing libraries so the first task doesn't pay for imports"""
+    import fitz  # noqa: F401
+    import pptx  # noqa: F401
+    import openpyxl  # noqa: F401
+    from services import file_processors  # noqa: F401
+
+    # Worker processes must not react to the Ctrl+C meant for the API server
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _raiseTimeout(signum, frame):
+    raise ExtractionTimeout()
+
+
+def _runWithTimeout(func: Callable[..., Any], timeout: float, *args) -> Tuple[Any, int]:
+    """
+    Run an async FileProcessor method inside a worker process.
+
+    The timeout is enforced in the worker with SIGALRM so a runaway document is
+    interrupted without having to kill the process.
+
+    Returns:
+        Tuple of the result and the worker's peak RSS in bytes
+    """
+    signal.signal(signal.SIGALRM, _raiseTimeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        result = asyncio.run(func(*args))
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result, peak_rss
+
+
+def _extractPagesInWorker(timeout: float, file_type: str, path: str, scan_images: bool,
+                          skip: AbstractSet[str]) -> Tuple[List[ExtractedPage], int]:
+    return _runWithTimeout(FileProcessor.extract_pages, timeout, file_type, path, scan_images, skip)
+
+
+def _extractPdfPagesInWorker(timeout: float, pdf_path: str, start: int, end: int, scan_images: bool,
+                             skip: AbstractSet[str]) -> Tuple[List[ExtractedPage], int]:
+    # Each worker opens its own document handle on the shared temp file
+    return _runWithTimeout(FileProcessor.extract_pdf_page_entries, timeout, pdf_path, start, end, scan_images, skip)
+
+
+@asynccontextmanager
+async def spoolToPath(file_obj: BinaryIO, suffix: str = "") -> AsyncIterator[str]:
+    """
+    Copy a file object to a temp file, chunk by chunk, and yield its path.
+
+    Worker processes and the PDF parser open documents by path, and spooled
+    uploads may not have one. The temp file is removed on exit.
+    """
+    with tempfile.NamedTemporaryFile(suffix=suffix) as temp_file:
+        file_obj.seek(0)
+        await asyncio.to_thread(shutil.copyfileobj, file_obj, temp_file)
+        temp_file.flush()
+        yield temp_file.name
+
+
+class ExtractionPool:
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ExtractionPool, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.max_workers = settings.EXTRACTION_POOL_WORKERS or os.cpu_count() or 1
+            self._executor: Optional[ProcessPoolExecutor] = None
+            self._initialized = True
+
+    def _createExecutor(self) -> ProcessPoolExecutor:
+        # Spawned workers don't inherit the API server's threads, sockets and
+        # connection pools, and spawning is required for max_tasks_per_child
+        kwargs = {}
+        if sys.version_info >= (3, 11) and settings.EXTRACTION_WORKER_MAX_TASKS > 0:
+            kwargs["max_tasks_per_child"] = settings.EXTRACTION_WORKER_MAX_TASKS
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warmWorker,
+            **kwargs
+        )
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = self._createExecutor()
+        return self._executor
+
+    async def start(self) -> None:
+        """Spawn and warm every worker ahead of the first request"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self.executor, _ping) for _ in range(self.max_workers)
+        ])
+        logger.info(f"Extraction pool started with {self.max_workers} workers")
+
+    def _recycle(self, executor: ProcessPoolExecutor, reason: str, terminate: bool = False) -> None:
+        """
+        Replace the worker pool if it is still executor.
+
+        By default the old workers finish their current tasks and exit. With
+        terminate=True they are killed immediately, failing any task they run.
+        Those tasks then ask to recycle the executor they ran on, which has
+        already been replaced, so the new pool is left alone.
+        """
+        if self._executor is not executor:
+            return
+        old_executor, self._executor = executor, None
+        logger.warning(f"Recycling extraction pool: {reason}")
+        processes = list((getattr(old_executor, "_processes", None) or {}).values())
+        old_executor.shutdown(wait=False, cancel_futures=terminate)
+        if terminate:
+            for process in processes:
+                process.terminate()
+
+    async def _submit(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Run a worker function in the pool and return its result.
+
+        Raises:
+            HTTPException: 504 if the task times out, 500 if the worker fails
+        """
+        timeout = settings.EXTRACTION_TASK_TIMEOUT
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        future = loop.run_in_executor(executor, func, timeout, *args)
+        try:
+            # The worker interrupts itself at the timeout; the extra grace period
+            # only expires if it is stuck in native code and has to be killed.
+            result, peak_rss = await asyncio.wait_for(future, timeout + settings.EXTRACTION_TIMEOUT_GRACE)
+        except ExtractionTimeout:
+            raise HTTPException(
+                status_code=504, detail=f"Extraction timed out after {timeout} seconds")
+        except asyncio.TimeoutError:
+            self._recycle(executor, "worker unresponsive after timeout", terminate=True)
+            raise HTTPException(
+                status_code=504, detail=f"Extraction timed out after {timeout} seconds")
+        except BrokenProcessPool as e:
+            self._recycle(executor, "worker process died")
+            logger.error(f"Extraction worker crashed: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail="Extraction worker crashed")
+
+        max_rss = settings.EXTRACTION_WORKER_MAX_RSS_MB * 1024 * 1024
+        if max_rss and peak_rss > max_rss:
+            self._recycle(executor, f"worker peak RSS {peak_rss // (1024 * 1024)} MB exceeds limit")
+        return result
+
+    async def extractPages(self, file_type: str, file_obj: BinaryIO, scan_images: bool = False,
+                           skip: AbstractSet[str] = frozenset()) -> List[ExtractedPage]:
+        """
+        Extract the pages of a document with their fingerprints in a worker
+        process, which reads it from a temp file
+        """
+        async with spoolToPath(file_obj, f".{file_type}") as path:
+            return await self._submit(_extractPagesInWorker, file_type, path, scan_images, frozenset(skip))
+
+    async def iterPdfPages(self, file_obj: BinaryIO, scan_images: bool = False,
+                           skip: AbstractSet[str] = frozenset()) -> AsyncIterator[ExtractedPage]:
+        """
+        Extract a PDF page-parallel, yielding its pages in document order.
+
+        The PDF is written to a temp file once and split into ranges of
+        EXTRACTION_PDF_PAGES_PER_TASK pages. The ranges are extracted
+        concurrently by the workers, each opening its own handle on the file.
+        Pages are yielded as soon as every range before them has finished, so
+        the caller can start on the first pages while later ones are parsed.
+        Pages whose fingerprint is in skip are yielded without text.
+        """
+        skip = frozenset(skip)
+        pages_per_task = max(1, settings.EXTRACTION_PDF_PAGES_PER_TASK)
+        async with spoolToPath(file_obj, ".pdf") as pdf_path:
+            try:
+                page_count = await asyncio.to_thread(FileProcessor.pdf_page_count, pdf_path)
+            except Exception as e:
+                logger.error(f"Failed to open PDF: {str(e)}")
+                raise HTTPException(
+                    status_code=422, detail="Failed to open PDF")
+
+            ranges = [asyncio.ensure_future(self._submit(
+                _extractPdfPagesInWorker, pdf_path, start,
+                min(start + pages_per_task, page_count), scan_images, skip))
+                for start in range(0, page_count, pages_per_task)]
+            try:
+                for page_range in ranges:
+                    for page in await page_range:
+                        yield page
+            finally:
+                for page_range in ranges:
+                    page_range.cancel()
+                    # Mark failures of abandoned ranges as retrieved
+                    page_range.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+    def close(self) -> None:
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+extraction_pool = ExtractionPool()
@@ -0,0 +1,252 @@
+import io
+import logging
+from typing import AbstractSet, BinaryIO, List, Optional, Union
+import fitz
+import pptx
+import openpyxl
+from core.pages import ExtractedPage, pageFingerprint
+
+logger = logging.getLogger(__name__)
+
+# A document's bytes, its path, or (except for PDFs) a seekable binary stream
+DocumentSource = Union[bytes, str, BinaryIO]
+
+class FileProcessor:
+    SUPPORTED_TYPES = ("pdf", "pptx", "xlsx")
+
+    @staticmethod
+    async def extract_text(file_type: str, file_bytes: bytes, scan_images: bool = False) -> str:
+        """
+        Extract text from a file using the extractor for its type.
+        """
+        if file_type == "pdf":
+            return await FileProcessor.extract_text_from_pdf(file_bytes, scan_images)
+        if file_type == "pptx":
+            return await FileProcessor.extract_text_from_pptx(file_bytes, scan_images)
+        if file_type == "xlsx":
+            return await FileProcessor.extract_text_from_xlsx(file_bytes)
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+    @staticmethod
+    async def extract_pages(file_type: str, source: DocumentSource, scan_images: bool = False,
+                            skip: AbstractSet[str] = frozenset()) -> List[ExtractedPage]:
+        """
+        Extract the non-empty pages, slides or sheets of a file with their fingerprints.
+
+        The file is given as bytes, a path or, except for PDFs, a stream, so
+        large files needn't be read into memory. Pages whose fingerprint is
+        in skip are returned without text, so their images are not OCR'd.
+        """
+        if file_type == "pdf":
+            return await FileProcessor.extract_pdf_page_entries(source, scan_images=scan_images, skip=skip)
+        if file_type == "pptx":
+            return await FileProcessor.extract_pptx_slides(source, scan_images, skip)
+        if file_type == "xlsx":
+            return await FileProcessor.extract_xlsx_sheets(source)
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+    @staticmethod
+    async def extract_text_from_pdf(file_bytes: bytes, scan_images: bool = False) -> str:
+        """
+        Extract text from a PDF file more efficiently, and OCR images in parallel if scan_images is True.
+        """
+        page_blocks = await FileProcessor.extract_pdf_pages(file_bytes, scan_images=scan_images)
+        return "\n".join(page_blocks)
+
+    @staticmethod
+    def pdf_page_count(source: Union[bytes, str]) -> int:
+        """
+        Count the pages of a PDF given its bytes or path.
+        """
+        with FileProcessor._open_pdf(source) as doc:
+            return doc.page_count
+
+    @staticmethod
+    def _open_file(source: DocumentSource) -> Union[str, BinaryIO]:
+        """A path or stream the PPTX and XLSX parsers can open"""
+        if isinstance(source, (bytes, bytearray)):
+            return io.BytesIO(source)
+        return source
+
+    @staticmethod
+    def _open_pdf(source: Union[bytes, str]) -> fitz.Document:
+        if isinstance(source, str):
+            return fitz.open(source, filetype="pdf")
+        return fitz.open(stream=source, filetype="pdf")
+
+    @staticmethod
+    async def extract_pdf_pages(source: Union[bytes, str], start: int = 0, end: Optional[int] = None,
+                                scan_images: bool = False) -> List[str]:
+        """
+        Extract pages [start, end) of a PDF, returning one text block per non-empty page.
+
+        The source may be the PDF bytes or a path, so that several worker
+        processes can each open their own handle on the same file.
+        """
+        pages = await FileProcessor.extract_pdf_page_entries(source, start, end, scan_images)
+        return [page.text for page in pages]
+
+    @staticmethod
+    async def extract_pdf_page_entries(source: Union[bytes, str], start: int = 0, end: Optional[int] = None,
+                                       scan_images: bool = False,
+                                       skip: AbstractSet[str] = frozenset()) -> List[ExtractedPage]:
+        """
+        Extract the non-empty pages [start, end) of a PDF with their fingerprints.
+
+        A page's fingerprint covers its text layer and, when scan_images is
+        True, its images. Pages whose fingerprint is in skip are returned
+        without text and their images are not OCR'd.
+        """
+        page_entries = []
+        try:
+            with FileProcessor._open_pdf(source) as doc:
+                end = doc.page_count if end is None else min(end, doc.page_count)
+                pages = []
+                image_bytes_list = []
+                for page_index in range(start, end):
+                    page = doc[page_index]
+                    page_text = page.get_text("text").strip()
+                    page_images = []
+                    if scan_images:
+                        for img in page.get_images(full=True):
+                            xref = img[0]
+                            base_image = doc.extract_image(xref)
+                            page_images.append(base_image["image"])
+                    fingerprint = pageFingerprint(page_text, page_images)
+                    # Images are collected for the whole range and OCR'd as one batch
+                    first_image = len(image_bytes_list)
+                    if fingerprint not in skip:
+                        image_bytes_list.extend(page_images)
+                    pages.append((page_index + 1, page_text, fingerprint, first_image, len(image_bytes_list)))
+
+            ocr_texts = []
+            if image_bytes_list:
+                from services.ocr_handler import ocr_images_concurrently
+
+                ocr_texts = await ocr_images_concurrently(image_bytes_list)
+
+            for page_num, page_text, fingerprint, first_image, last_image in pages:
+                if fingerprint in skip:
+                    page_entries.append(ExtractedPage(fingerprint, None))
+                    continue
+
+                page_lines = []
+                if page_text:
+                    page_lines.append(f"--- Page {page_num} Text ---")
+                    page_lines.append(page_text)
+
+                for idx, ocr_txt in enumerate(ocr_texts[first_image:last_image], start=1):
+                    if ocr_txt:
+                        page_lines.append(f"--- Page {page_num} Image {idx} OCR ---")
+                        page_lines.append(ocr_txt)
+
+                if page_lines:
+                    page_entries.append(ExtractedPage(fingerprint, "\n".join(page_lines).replace("\t", " ")))
+
+        except Exception as e:
+            logger.exception("PDF Extraction Error")
+
+        return page_entries
+
+    @staticmethod
+    async def extract_text_from_pptx(file_bytes: bytes, scan_images: bool = False) -> str:
+        """
+        Extract text from a PPTX file, and OCR images if scan_images is True.
+        """
+        slides = await FileProcessor.extract_pptx_slides(file_bytes, scan_images)
+        return "\n".join(slide.text for slide in slides)
+
+    @staticmethod
+    async def extract_pptx_slides(source: DocumentSource, scan_images: bool = False,
+                                  skip: AbstractSet[str] = frozenset()) -> List[ExtractedPage]:
+        """
+        Extract the non-empty slides of a PPTX file with their fingerprints.
+
+        Slides whose fingerprint is in skip are returned without text and
+        their images are not OCR'd.
+        """
+        slide_entries = []
+        try:
+            prs = pptx.Presentation(FileProcessor._open_file(source))
+            slides = []
+            image_bytes_list = []
+            for slide_num, slide in enumerate(prs.slides, start=1):
+                # Shape texts, with the index of each image to OCR in its place
+                slide_items = []
+                slide_images = []
+                for shape in slide.shapes:
+                    if hasattr(shape, "text"):
+                        shape_text = shape.text.strip()
+                        if shape_text:
+                            slide_items.append(shape_text)
+
+                    if scan_images and hasattr(shape, "image"):
+                        slide_items.append(len(image_bytes_list) + len(slide_images))
+                        slide_images.append(shape.image.blob)
+
+                fingerprint = pageFingerprint(
+                    "\n".join(item for item in slide_items if isinstance(item, str)), slide_images)
+                if fingerprint not in skip:
+                    image_bytes_list.extend(slide_images)
+                slides.append((slide_num, slide_items, fingerprint))
+
+            # OCR the images of all slides as one batch
+            ocr_texts = []
+            if image_bytes_list:
+                from services.ocr_handler import ocr_images_concurrently
+
+                ocr_texts = await ocr_images_concurrently(image_bytes_list)
+
+            for slide_num, slide_items, fingerprint in slides:
+                if fingerprint in skip:
+                    slide_entries.append(ExtractedPage(fingerprint, None))
+                    continue
+
+                slide_text = []
+                for item in slide_items:
+                    if isinstance(item, str):
+                        slide_text.append(item)
+                    elif ocr_texts[item]:
+                        slide_text.append(f"OCR Image Text: {ocr_texts[item]}")
+
+                if slide_text:
+                    block = f"--- Slide {slide_num} ---\n" + "\n".join(slide_text)
+                    slide_entries.append(ExtractedPage(fingerprint, block.replace("\t", " ")))
+
+        except Exception as e:
+            logger.exception("PPTX Extraction Error")
+
+        return slide_entries
+
+    @staticmethod
+    async def extract_text_from_xlsx(file_bytes: bytes) -> str:
+        """
+        Extract text from an XLSX file.
+        """
+        sheets = await FileProcessor.extract_xlsx_sheets(file_bytes)
+        return "\n".join(sheet.text for sheet in sheets)
+
+    @staticmethod
+    async def extract_xlsx_sheets(source: DocumentSource) -> List[ExtractedPage]:
+        """
+        Extract the non-empty sheets of an XLSX file, fingerprinted by their text.
+        """
+        sheet_entries = []
+        try:
+            wb = openpyxl.load_workbook(FileProcessor._open_file(source), data_only=True)
+            for sheet_name in wb.sheetnames:
+                ws = wb[sheet_name]
+                sheet_text = []
+                for row in ws.iter_rows(values_only=True):
+                    row_text = "\t".join([str(cell).strip() if cell is not None else "" for cell in row])
+                    if row_text.strip():
+                        sheet_text.append(row_text)
+                
+                if sheet_text:
+                    block = (f"--- Sheet: {sheet_name} ---\n" + "\n".join(sheet_text)).replace("\t", " ")
+                    sheet_entries.append(ExtractedPage(pageFingerprint(block), block))
+
+        except Exception as e:
+            logger.exception("XLSX Extraction Error")
+
+        return sheet_entries
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from core.config import settings
+from services.db_service import db_service
+from services.s3_service import s3_service
+
+logger = logging.getLogger(__name__)
+
+
+class HealthService:
+    """
+    Probes the service dependencies for the health endpoints.
+
+    The probes run concurrently, each bounded by HEALTH_CHECK_TIMEOUT, and
+    their results are reused for HEALTH_CHECK_CACHE_TTL seconds. Requests that
+    arrive while a check is running wait for it instead of starting another.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(HealthService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.db_service = db_service
+            self.s3_service = s3_service
+            self._results: Optional[Dict[str, bool]] = None
+            self._checked_at = 0.0
+            self._check: Optional[asyncio.Task] = None
+            self._initialized = True
+
+    def _probes(self) -> Dict[str, Callable[[], Awaitable[bool]]]:
+        return {
+            "database": self.db_service.checkHealthAsync,
+            "s3": self.s3_service.checkHealthAsync,
+        }
+
+    async def _probe(self, name: str, check: Callable[[], Awaitable[bool]]) -> bool:
+        try:
+            return bool(await asyncio.wait_for(check(), timeout=settings.HEALTH_CHECK_TIMEOUT))
+        except asyncio.TimeoutError:
+            logger.error(f"{name} health check timed out after {settings.HEALTH_CHECK_TIMEOUT}s")
+            return False
+        except Exception as e:
+            logger.error(f"{name} health check failed: {str(e)}")
+            return False
+
+    async def _checkAll(self) -> Dict[str, bool]:
+        probes = self._probes()
+        results = await asyncio.gather(*(self._probe(name, check) for name, check in probes.items()))
+        self._results = dict(zip(probes, results))
+        self._checked_at = time.monotonic()
+        return self._results
+
+    async def checkDependencies(self) -> Dict[str, bool]:
+        """
+        Report whether each dependency is healthy.
+
+        Returns:
+            A mapping of dependency name to its health, possibly cached
+        """
+        if self._results is not None and time.monotonic() - self._checked_at < settings.HEALTH_CHECK_CACHE_TTL:
+            return dict(self._results)
+
+        loop = asyncio.get_running_loop()
+        if self._check is None or self._check.done() or self._check.get_loop() is not loop:
+            self._check = loop.create_task(self._checkAll())
+        # Shielded, so a disconnecting client doesn't cancel the check for the others
+        return dict(await asyncio.shield(self._check))
+
+    def invalidate(self) -> None:
+        """Forget the cached results, so the next check probes again"""
+        self._results = None
+
+
+health_service = HealthService()
@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from PIL import Image, ImageOps
+from core.cache import LRUCache
+from core.config import settings
+
+try:
+    import pytesseract
+except ImportError:  # OCR is optional; images are skipped without it
+    pytesseract = None
+
+logger = logging.getLogger(__name__)
+
+# Tesseract runs as a subprocess, so threads are enough to keep every core busy
+_executor: Optional[ThreadPoolExecutor] = None
+
+# OCR results keyed by image hash, so images repeated across pages and slides
+# (logos, footers, backgrounds) are recognized only once
+_ocr_cache = LRUCache(max_items=settings.OCR_CACHE_MAX_ITEMS)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.OCR_MAX_WORKERS, thread_name_prefix="ocr")
+    return _executor
+
+
+def preprocess_image(image: Image.Image) -> Optional[Image.Image]:
+    """
+    Prepare an image for recognition.
+
+    Converts to grayscale and downscales so the longest side is at most
+    OCR_MAX_IMAGE_DIMENSION. Returns None for images too small to contain
+    readable text.
+    """
+    if min(image.size) < settings.OCR_MIN_IMAGE_DIMENSION:
+        return None
+    image = ImageOps.exif_transpose(image).convert("L")
+    if max(image.size) > settings.OCR_MAX_IMAGE_DIMENSION:
+        image.thumbnail((settings.OCR_MAX_IMAGE_DIMENSION, settings.OCR_MAX_IMAGE_DIMENSION))
+    return image
+
+
+def perform_ocr(image: Image.Image) -> str:
+    """
+    Recognize the text in a single image.
+    """
+    if pytesseract is None:
+        logger.warning("pytesseract is not installed, skipping OCR")
+        return ""
+    prepared = preprocess_image(image)
+    if prepared is None:
+        return ""
+    return pytesseract.image_to_string(prepared, lang=settings.OCR_LANGUAGES).strip()
+
+
+def _ocr_image_bytes(image_bytes: bytes) -> str:
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return perform_ocr(image)
+    except Exception:
+        logger.exception("OCR Error")
+        return ""
+
+
+async def ocr_images_concurrently(image_bytes_list: List[bytes]) -> List[str]:
+    """
+    OCR a batch of images on the OCR thread pool.
+
+    Identical images in the batch are recognized once, and results are cached
+    by image hash across batches. Returns one text per input image, in order.
+    """
+    if not image_bytes_list:
+        return []
+
+    hashes = [hashlib.sha1(image_bytes).hexdigest() for image_bytes in image_bytes_list]
+    results = {}
+    pending = {}
+    for image_hash, image_bytes in zip(hashes, image_bytes_list):
+        cached = _ocr_cache.get(image_hash)
+        if cached is not None:
+            results[image_hash] = cached
+        elif image_hash not in pending:
+            pending[image_hash] = image_bytes
+
+    if pending:
+        loop = asyncio.get_running_loop()
+        texts = await asyncio.gather(*[
+            loop.run_in_executor(_get_executor(), _ocr_image_bytes, image_bytes)
+            for image_bytes in pending.values()
+        ])
+        for image_hash, text in zip(pending, texts):
+            _ocr_cache.set(image_hash, text)
+            results[image_hash] = text
+
+    return [results[image_hash] for image_hash in hashes]
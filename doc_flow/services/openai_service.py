@@ -1,10 +1,15 @@
 import os
-from openai import OpenAI
+import asyncio
+import hashlib
+from openai import AsyncOpenAI
 import openai
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 import logging
 from dotenv import load_dotenv
 from fastapi import HTTPException
+from core.config import settings
+from core.chunking import ChunkPacker, splitIntoChunks, mergeTopics
+from core.metrics import BYTES_PROCESSED, timeStage
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -23,30 +28,63 @@ class OpenAIService:
             self.api_key = os.environ.get("OPENAI_API_KEY")
             if not self.api_key:
                 raise ValueError("OPENAI_API_KEY environment variable is not set")
-            self.client = OpenAI(api_key=self.api_key)
+            self.client = AsyncOpenAI(api_key=self.api_key, timeout=settings.OPENAI_TIMEOUT)
+            # Caps the number of in-flight OpenAI requests per worker
+            self._semaphore = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENT_REQUESTS)
+            # Pending requests keyed by input hash, so identical concurrent
+            # inputs share a single upstream call
+            self._inflight: Dict[str, asyncio.Future] = {}
             self._initialized = True
 
     async def extractTopics(self, text: str) -> List[str]:
         """
         Extract relevant topics from the text using OpenAI API.
+
+        Long texts are split on page and slide boundaries into chunks of at most
+        OPENAI_CHUNK_MAX_TOKENS, topics are extracted from every chunk
+        concurrently and the results are merged without duplicates.
         """
+        chunks = splitIntoChunks(text, settings.OPENAI_CHUNK_MAX_TOKENS)
+        if len(chunks) <= 1:
+            return await self._coalescedTopics(text)
+
+        logger.info(f"Extracting topics from {len(chunks)} chunks")
+        chunk_topics = await asyncio.gather(*[self._coalescedTopics(chunk) for chunk in chunks])
+        return mergeTopics(chunk_topics)
+
+    async def _coalescedTopics(self, text: str) -> List[str]:
+        """Extract topics, coalescing concurrent calls with identical text into one request"""
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        request = self._inflight.get(key)
+        if request is None:
+            request = asyncio.ensure_future(self._requestTopics(text))
+            self._inflight[key] = request
+            request.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield the shared request so one cancelled caller doesn't cancel it
+        # for every other caller waiting on the same input
+        return list(await asyncio.shield(request))
+
+    async def _requestTopics(self, text: str) -> List[str]:
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"Extract main distinct and non-overlapping topics from the following text. Return them as a comma-separated list with descriptive names with relation to the main topic of the text."
-                    },
-                    {
-                        "role": "user",
-                        "content": text
-                    }
-                ],
-                temperature=0.5,
-                max_tokens=16383
-            )
-            
+            async with self._semaphore:
+                BYTES_PROCESSED.inc(len(text.encode('utf-8')), service="openai", direction="out")
+                with timeStage("openai", "extract_topics"):
+                    response = await self.client.chat.completions.create(
+                        model="gpt-4o-mini",
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": f"Extract main distinct and non-overlapping topics from the following text. Return them as a comma-separated list with descriptive names with relation to the main topic of the text."
+                            },
+                            {
+                                "role": "user",
+                                "content": text
+                            }
+                        ],
+                        temperature=0.5,
+                        max_tokens=16383
+                    )
+
             topics = response.choices[0].message.content.split(",")
             return [topic.strip() for topic in topics]
         except Exception as e:
@@ -72,7 +110,7 @@ class OpenAIService:
                     status_code=503,
                     detail="Unable to connect to OpenAI services. Please check your internet connection."
                 )
-            elif isinstance(e, openai.InvalidRequestError):
+            elif isinstance(e, openai.BadRequestError):
                 raise HTTPException(
                     status_code=400,
                     detail="Invalid request parameters. Please check your input."
@@ -84,4 +122,63 @@ class OpenAIService:
                 detail="An unexpected error occurred while processing your request. Please try again later."
             )
 
+class TopicStream:
+    """
+    Extracts topics from a document while its sections are still being produced.
+
+    Sections are packed into chunks of at most OPENAI_CHUNK_MAX_TOKENS and each
+    chunk is sent to OpenAI as soon as it is complete. finish() waits for the
+    remaining chunks and merges their topics.
+
+    Sections may be labelled with the page they come from; once finished,
+    chunks lists the labels and topics of every chunk, so that the topics of
+    unchanged pages can be reused for a later version of the document.
+    """
+
+    def __init__(self, service: OpenAIService):
+        self._service = service
+        self._packer = ChunkPacker(settings.OPENAI_CHUNK_MAX_TOKENS)
+        self._requests: List[Tuple[List, asyncio.Future]] = []
+        self.chunks: List[Tuple[List, List[str]]] = []
+
+    def add(self, section: str, label: Optional[Any] = None) -> None:
+        packed = len(self._packer.chunk_labels)
+        self._submitAll(self._packer.add(section, label), packed)
+
+    def reuse(self, topics: List[str], labels: List) -> None:
+        """
+        Add the topics of a chunk extracted earlier, without a request.
+
+        The sections added so far are sent as a chunk first, so that topics
+        stay in document order.
+        """
+        packed = len(self._packer.chunk_labels)
+        self._submitAll(self._packer.finish(), packed)
+        request = asyncio.get_running_loop().create_future()
+        request.set_result(list(topics))
+        self._requests.append((labels, request))
+
+    def _submitAll(self, chunks: List[str], packed: int) -> None:
+        for chunk, labels in zip(chunks, self._packer.chunk_labels[packed:]):
+            self._requests.append((labels, asyncio.ensure_future(self._service.extractTopics(chunk))))
+
+    async def finish(self) -> List[str]:
+        packed = len(self._packer.chunk_labels)
+        self._submitAll(self._packer.finish(), packed)
+        try:
+            chunk_topics = await asyncio.gather(*[request for _, request in self._requests])
+        except BaseException:
+            self.cancel()
+            raise
+        self.chunks = [(labels, topics) for (labels, _), topics in zip(self._requests, chunk_topics)]
+        if len(chunk_topics) == 1:
+            return chunk_topics[0]
+        return mergeTopics(chunk_topics)
+
+    def cancel(self) -> None:
+        """Cancel the outstanding chunk requests"""
+        for _, request in self._requests:
+            request.cancel()
+
+
 openai_service = OpenAIService()
\ No newline at end of file
@@ -1,11 +1,164 @@
+import asyncio
+import functools
 import logging
+import os
+import re
+import tempfile
+import uuid
 import boto3
-from typing import Optional
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
 from core.config import settings
+from core.metrics import BYTES_PROCESSED, timeStage
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
+# S3 rejects multipart uploads whose parts, other than the last, are smaller
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+# S3 keys are at most 1024 bytes of UTF-8
+S3_MAX_KEY_LENGTH = 1024
+# User IDs that may name an upload prefix, e.g. the Wasp app's UUIDs
+USER_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,128}")
+# Extensions kept from the client's filename in generated upload keys
+UPLOAD_EXTENSION_PATTERN = re.compile(r"\.[a-z0-9]{1,10}")
+
+
+class MultipartUpload:
+    """
+    Uploads an object to S3 in parts as its content is produced.
+
+    Content is buffered until a part of S3_MULTIPART_PART_SIZE is full. The
+    part is then uploaded in the background while the next one fills up, so
+    at most two parts are held in memory. Use as an async context manager:
+    the upload is completed on exit, or aborted if an exception was raised.
+    """
+
+    def __init__(self, service: "S3Service", key: str, content_type: Optional[str] = None):
+        self.service = service
+        self.key = key
+        self.content_type = content_type
+        self.part_size = max(settings.S3_MULTIPART_PART_SIZE, S3_MIN_PART_SIZE)
+        self.size = 0
+        self._upload_id: Optional[str] = None
+        self._buffer = bytearray()
+        self._parts: List[Dict] = []
+        self._pending: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "MultipartUpload":
+        extra_args = {'ContentType': self.content_type} if self.content_type else {}
+        try:
+            response = await self.service._run(
+                "create_multipart_upload",
+                self.service.s3_client.create_multipart_upload,
+                Bucket=self.service.bucket,
+                Key=self.key,
+                **extra_args
+            )
+        except Exception as e:
+            logger.error(f"Failed to upload file to S3: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to upload file to S3: {str(e)}"
+            )
+        self._upload_id = response['UploadId']
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.complete()
+        else:
+            await self.abort()
+
+    async def write(self, data: bytes) -> None:
+        """Append data, uploading a part whenever one is full"""
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            await self._startPart(part)
+
+    async def _startPart(self, content: bytes) -> None:
+        # Wait for the previous part so only one upload is in flight
+        if self._pending is not None:
+            await self._pending
+        part_number = len(self._parts) + 1
+        self._pending = asyncio.ensure_future(self._uploadPart(part_number, content))
+
+    async def _uploadPart(self, part_number: int, content: bytes) -> None:
+        try:
+            response = await self.service._run(
+                "upload_part",
+                self.service.s3_client.upload_part,
+                Bucket=self.service.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                Body=content
+            )
+            BYTES_PROCESSED.inc(len(content), service="s3", direction="out")
+        except Exception as e:
+            logger.error(f"Failed to upload file to S3: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to upload file to S3: {str(e)}"
+            )
+        self._parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+    async def complete(self) -> None:
+        """
+        Upload the remaining content and assemble the object.
+
+        The upload is aborted if any of it fails, so no parts are left behind.
+        """
+        try:
+            # An empty object still needs one (empty) part
+            if self._buffer or not self._parts and self._pending is None:
+                await self._startPart(bytes(self._buffer))
+                self._buffer.clear()
+            if self._pending is not None:
+                await self._pending
+                self._pending = None
+            try:
+                await self.service._run(
+                    "complete_multipart_upload",
+                    self.service.s3_client.complete_multipart_upload,
+                    Bucket=self.service.bucket,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={'Parts': self._parts}
+                )
+            except Exception as e:
+                logger.error(f"Failed to upload file to S3: {str(e)}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Failed to upload file to S3: {str(e)}"
+                )
+        except BaseException:
+            await self.abort()
+            raise
+
+    async def abort(self) -> None:
+        """Discard the uploaded parts"""
+        if self._pending is not None:
+            self._pending.cancel()
+            await asyncio.gather(self._pending, return_exceptions=True)
+            self._pending = None
+        try:
+            await self.service._run(
+                "abort_multipart_upload",
+                self.service.s3_client.abort_multipart_upload,
+                Bucket=self.service.bucket,
+                Key=self.key,
+                UploadId=self._upload_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to abort multipart upload: {str(e)}")
+
+
 class S3Service:
     _instance = None
     _initialized = False
@@ -21,16 +174,44 @@ class S3Service:
                 's3',
                 aws_access_key_id=settings.AWS_S3_IAM_ACCESS_KEY,
                 aws_secret_access_key=settings.AWS_S3_IAM_SECRET_KEY,
-                region_name=settings.AWS_S3_REGION
+                region_name=settings.AWS_S3_REGION,
+                endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                config=Config(
+                    max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                    connect_timeout=settings.S3_CONNECT_TIMEOUT,
+                    read_timeout=settings.S3_READ_TIMEOUT,
+                    retries={'max_attempts': settings.S3_MAX_RETRIES, 'mode': 'standard'},
+                    # Custom endpoints rarely resolve bucket subdomains
+                    s3={'addressing_style': 'path'} if settings.AWS_S3_ENDPOINT_URL else None
+                )
+            )
+            # boto3 clients are thread-safe, so one client and its connection
+            # pool is shared by every worker thread.
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.S3_MAX_WORKERS,
+                thread_name_prefix="s3-io"
             )
             self.bucket = settings.AWS_S3_EXERCISES_BUCKET
             self._initialized = True
 
+    async def _run(self, operation: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a blocking boto3 call on the S3 executor without blocking the event loop.
+
+        The call is timed under operation, e.g. "put_object", including the
+        wait for a free worker.
+        """
+        loop = asyncio.get_running_loop()
+        with timeStage("s3", operation):
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
     async def uploadFile(self, key: str, content: bytes, content_type: Optional[str] = None) -> bool:
         """Upload a file to S3"""
         try:
             extra_args = {'ContentType': content_type} if content_type else {}
-            response = self.s3_client.put_object(
+            response = await self._run(
+                "put_object",
+                self.s3_client.put_object,
                 Bucket=self.bucket,
                 Key=key,
                 Body=content,
@@ -38,6 +219,7 @@ class S3Service:
             )
             if response['ResponseMetadata']['HTTPStatusCode'] != 200:
                 raise Exception(f"S3 upload failed with status code: {response['ResponseMetadata']['HTTPStatusCode']}")
+            BYTES_PROCESSED.inc(len(content), service="s3", direction="out")
             return True
         except Exception as e:
             logger.error(f"Failed to upload file to S3: {str(e)}")
@@ -46,26 +228,360 @@ class S3Service:
                 detail=f"Failed to upload file to S3: {str(e)}"
             )
 
+    def openMultipartUpload(self, key: str, content_type: Optional[str] = None) -> MultipartUpload:
+        """
+        Start a multipart upload, for content that is produced incrementally.
+
+        Usage:
+            async with s3_service.openMultipartUpload(key, "audio/mpeg") as upload:
+                await upload.write(data)
+        """
+        return MultipartUpload(self, key, content_type)
+
     async def getFile(self, key: str) -> Optional[bytes]:
         """Retrieve a file from S3"""
         try:
-            response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
-            return response['Body'].read()
+            return await self._run("get_object", self._getObjectBytes, key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                logger.info(f"File not found in S3: {key}")
+            else:
+                logger.error(f"Failed to get file from S3: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"Failed to get file from S3: {str(e)}")
             return None
 
+    def _getObjectBytes(self, key: str) -> bytes:
+        # The body is read on the worker thread as well, since reading the
+        # streaming body is where most of the blocking time is spent.
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        content = response['Body'].read()
+        BYTES_PROCESSED.inc(len(content), service="s3", direction="in")
+        return content
+
+    async def spoolFile(self, key: str) -> Optional[BinaryIO]:
+        """
+        Download a file from S3 into a spooled temporary file.
+
+        The file stays in memory up to S3_SPOOL_MAX_MEMORY bytes and rolls over
+        to disk beyond that. The caller is responsible for closing it.
+        """
+        try:
+            return await self._run("get_object", self._spoolObject, key)
+        except Exception as e:
+            logger.error(f"Failed to get file from S3: {str(e)}")
+            return None
+
+    def _spoolObject(self, key: str) -> BinaryIO:
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=key)
+        spool = tempfile.SpooledTemporaryFile(max_size=settings.S3_SPOOL_MAX_MEMORY)
+        try:
+            for chunk in response['Body'].iter_chunks(chunk_size=settings.S3_STREAM_CHUNK_SIZE):
+                spool.write(chunk)
+            BYTES_PROCESSED.inc(spool.tell(), service="s3", direction="in")
+            spool.seek(0)
+            return spool
+        except Exception:
+            spool.close()
+            raise
+
+    async def copyFile(self, source_key: str, dest_key: str) -> bool:
+        """Copy a file within the bucket server-side, without downloading it"""
+        try:
+            await self._run(
+                "copy_object",
+                self.s3_client.copy_object,
+                Bucket=self.bucket,
+                Key=dest_key,
+                CopySource={'Bucket': self.bucket, 'Key': source_key}
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to copy file in S3: {str(e)}")
+            return False
+
     async def deleteFile(self, key: str) -> bool:
         """Delete a file from S3"""
         try:
-            self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+            await self._run("delete_object", self.s3_client.delete_object, Bucket=self.bucket, Key=key)
             return True
         except Exception as e:
             logger.error(f"Failed to delete file from S3: {str(e)}")
             return False
 
+    async def checkHealthAsync(self) -> bool:
+        """Check that the exercises bucket is reachable"""
+        try:
+            await self._run("head_bucket", self.s3_client.head_bucket, Bucket=self.bucket)
+            return True
+        except Exception as e:
+            logger.error(f"S3 health check failed: {str(e)}")
+            return False
+
+    def userUploadPrefix(self, user_id: str) -> str:
+        """
+        Prefix of the keys a user's uploads are stored under.
+
+        Raises:
+            HTTPException: 400 if user_id isn't a plain ID
+        """
+        if not USER_ID_PATTERN.fullmatch(user_id or ""):
+            raise HTTPException(status_code=400, detail=f"Invalid user ID: {user_id!r}")
+        return f"{settings.S3_UPLOAD_PREFIX}{user_id}/"
+
+    def newUploadKey(self, user_id: str, filename: Optional[str] = None) -> str:
+        """
+        Choose a fresh key under the user's prefix for an upload, keeping the
+        extension of filename if it has a plain one
+        """
+        extension = os.path.splitext(filename or "")[1].lower()
+        if not UPLOAD_EXTENSION_PATTERN.fullmatch(extension):
+            extension = ""
+        return f"{self.userUploadPrefix(user_id)}{uuid.uuid4().hex}{extension}"
+
+    def checkOwnedKey(self, user_id: str, key: str) -> None:
+        """
+        Check that key is one of the user's uploads.
+
+        Raises:
+            HTTPException: 400 for malformed keys, 403 for other users' keys
+        """
+        if (not key or len(key.encode("utf-8")) > S3_MAX_KEY_LENGTH
+                or ".." in key.split("/") or any(ord(char) < 32 or char in "\\\x7f" for char in key)):
+            raise HTTPException(status_code=400, detail=f"Invalid S3 key: {key!r}")
+        if not key.startswith(self.userUploadPrefix(user_id)):
+            raise HTTPException(status_code=403, detail=f"S3 key {key} does not belong to user {user_id}")
+
+    def _presign(self, operation: str, expires_in: int, **params) -> str:
+        # Signing is local, so no request is made to S3
+        try:
+            return self.s3_client.generate_presigned_url(
+                operation,
+                Params={'Bucket': self.bucket, **params},
+                ExpiresIn=expires_in
+            )
+        except Exception as e:
+            logger.error(f"Failed to generate presigned URL: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to generate presigned URL: {str(e)}"
+            )
+
+    def getUploadUrl(self, user_id: str, filename: Optional[str] = None,
+                     content_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Presign a POST of a file to a new key under the user's prefix, so the
+        client uploads it directly.
+
+        The policy limits the upload to S3_UPLOAD_MAX_BYTES and, if given, the
+        content type: the client must send the returned fields with the file
+        as multipart/form-data.
+
+        Returns:
+            The key, URL, HTTP method, form fields, size limit and expiry in seconds
+        """
+        key = self.newUploadKey(user_id, filename)
+        expires_in = settings.S3_PRESIGNED_URL_EXPIRES
+        fields = {}
+        conditions: List[Any] = [["content-length-range", 1, settings.S3_UPLOAD_MAX_BYTES]]
+        if content_type:
+            fields['Content-Type'] = content_type
+            conditions.append({'Content-Type': content_type})
+        try:
+            post = self.s3_client.generate_presigned_post(
+                Bucket=self.bucket,
+                Key=key,
+                Fields=fields,
+                Conditions=conditions,
+                ExpiresIn=expires_in
+            )
+        except Exception as e:
+            logger.error(f"Failed to generate presigned URL: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to generate presigned URL: {str(e)}"
+            )
+        return {
+            "key": key,
+            "url": post['url'],
+            "method": "POST",
+            "fields": post['fields'],
+            "max_size": settings.S3_UPLOAD_MAX_BYTES,
+            "expires_in": expires_in,
+        }
+
+    def getDownloadUrl(self, key: str, filename: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Presign a GET of a file from S3, so the client downloads it directly.
+
+        The caller must have checked that the client may read key.
+
+        Args:
+            key: S3 key
+            filename: Optional name to download the file as
+
+        Returns:
+            The URL, HTTP method and expiry in seconds
+        """
+        expires_in = settings.S3_PRESIGNED_URL_EXPIRES
+        params = {'Key': key}
+        if filename:
+            params['ResponseContentDisposition'] = f'attachment; filename="{filename.replace(chr(34), "")}"'
+        return {
+            "url": self._presign('get_object', expires_in, **params),
+            "method": "GET",
+            "expires_in": expires_in,
+        }
+
+    async def createPresignedMultipartUpload(self, user_id: str, part_count: int, filename: Optional[str] = None,
+                                             content_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Start a multipart upload to a new key under the user's prefix, whose
+        parts the client uploads directly.
+
+        Every part but the last must be at least 5 MiB, so no more parts are
+        handed out than S3_UPLOAD_MAX_BYTES allows. The client PUTs each part
+        to its URL and passes the returned ETag headers to
+        completePresignedMultipartUpload (browsers need the bucket's CORS
+        configuration to expose ETag).
+
+        Returns:
+            The key, upload ID, a URL per part number and the expiry in seconds
+        """
+        max_parts = min(settings.S3_PRESIGNED_MAX_PARTS, settings.S3_UPLOAD_MAX_BYTES // S3_MIN_PART_SIZE + 1)
+        if not 1 <= part_count <= max_parts:
+            raise HTTPException(
+                status_code=400,
+                detail=f"part_count must be between 1 and {max_parts}"
+            )
+        key = self.newUploadKey(user_id, filename)
+
+        extra_args = {'ContentType': content_type} if content_type else {}
+        try:
+            response = await self._run(
+                "create_multipart_upload",
+                self.s3_client.create_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                **extra_args
+            )
+        except Exception as e:
+            logger.error(f"Failed to start multipart upload: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to start multipart upload: {str(e)}"
+            )
+
+        upload_id = response['UploadId']
+        expires_in = settings.S3_PRESIGNED_URL_EXPIRES
+        return {
+            "key": key,
+            "upload_id": upload_id,
+            "min_part_size": S3_MIN_PART_SIZE,
+            "max_size": settings.S3_UPLOAD_MAX_BYTES,
+            "parts": [
+                {
+                    "part_number": part_number,
+                    "url": self._presign('upload_part', expires_in, Key=key,
+                                         UploadId=upload_id, PartNumber=part_number),
+                }
+                for part_number in range(1, part_count + 1)
+            ],
+            "expires_in": expires_in,
+        }
+
+    def _uploadedSize(self, key: str, upload_id: str) -> int:
+        size = 0
+        paginator = self.s3_client.get_paginator('list_parts')
+        for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+            size += sum(part['Size'] for part in page.get('Parts', []))
+        return size
+
+    async def completePresignedMultipartUpload(self, user_id: str, key: str, upload_id: str,
+                                               parts: List[Dict]) -> bool:
+        """
+        Assemble a multipart upload of the user's from the parts the client
+        uploaded. Uploads larger than S3_UPLOAD_MAX_BYTES are aborted instead.
+
+        Args:
+            user_id: User the upload was created for
+            key: S3 key from createPresignedMultipartUpload
+            upload_id: Upload ID from createPresignedMultipartUpload
+            parts: {"part_number", "etag"} of every uploaded part
+        """
+        self.checkOwnedKey(user_id, key)
+        try:
+            completed_parts = sorted(
+                ({'PartNumber': int(part['part_number']), 'ETag': str(part['etag'])} for part in parts),
+                key=lambda part: part['PartNumber']
+            )
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Each part needs a part_number and an etag")
+        if not completed_parts:
+            raise HTTPException(status_code=400, detail="No parts to complete the upload with")
+
+        try:
+            size = await self._run("list_parts", self._uploadedSize, key, upload_id)
+            if size > settings.S3_UPLOAD_MAX_BYTES:
+                await self.abortPresignedMultipartUpload(user_id, key, upload_id)
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Upload of {size} bytes exceeds the limit of {settings.S3_UPLOAD_MAX_BYTES}"
+                )
+            await self._run(
+                "complete_multipart_upload",
+                self.s3_client.complete_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': completed_parts}
+            )
+            return True
+        except HTTPException:
+            raise
+        except ClientError as e:
+            # Missing or too small parts and unknown uploads are the client's doing
+            if e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 500) >= 500:
+                logger.error(f"Failed to complete multipart upload: {str(e)}")
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Failed to complete multipart upload: {str(e)}"
+                )
+            logger.info(f"Failed to complete multipart upload: {str(e)}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Failed to complete multipart upload: {str(e)}"
+            )
+        except Exception as e:
+            logger.error(f"Failed to complete multipart upload: {str(e)}")
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to complete multipart upload: {str(e)}"
+            )
+
+    async def abortPresignedMultipartUpload(self, user_id: str, key: str, upload_id: str) -> bool:
+        """Discard a multipart upload of the user's and the parts uploaded so far"""
+        self.checkOwnedKey(user_id, key)
+        try:
+            await self._run(
+                "abort_multipart_upload",
+                self.s3_client.abort_multipart_upload,
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to abort multipart upload: {str(e)}")
+            return False
+
     def getFileUrl(self, key: str) -> str:
         """Generate a URL for a file in S3"""
         return f"https://{self.bucket}.s3.amazonaws.com/{key}"
 
-s3_service = S3Service()
\ No newline at end of file
+    def close(self):
+        """Release the S3 worker threads"""
+        self._executor.shutdown(wait=False)
+
+s3_service = S3Service()